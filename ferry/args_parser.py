@@ -4,7 +4,9 @@ from typing import Any, cast
 
 
 class RawArgs:
+    cache_dir: str
     cas_cookie: str | None
+    class_concurrency: int
     config_file: str | None
     crawl_classes: bool
     crawl_evals: bool
@@ -13,7 +15,10 @@ class RawArgs:
     data_dir: str
     database_connect_string: str | None
     debug: bool
+    eval_concurrency: int
     generate_diagram: bool
+    incremental: bool
+    incremental_transform: bool
     openai_api_key: str | None
     llm_model: str | None
     llm_base_url: str | None
@@ -23,11 +28,13 @@ class RawArgs:
     save_config: bool
     seasons: list[str] | None
     sentry_url: str | None
+    skip_sentiment: bool
     snapshot_tables: bool
     summarize_evals: bool
     sync_db_courses: bool
     sync_db_evals: bool
     transform: bool
+    transform_workers: int | None
     use_cache: bool
     freeze_locations: bool
     ycs_cookie: str | None
@@ -35,7 +42,9 @@ class RawArgs:
 
 
 class Args:
+    cache_dir: Path
     cas_cookie: str
+    class_concurrency: int
     crawl_classes: bool
     crawl_evals: bool
     crawl_seasons: bool
@@ -43,7 +52,10 @@ class Args:
     data_dir: Path
     database_connect_string: str
     debug: bool
+    eval_concurrency: int
     generate_diagram: bool
+    incremental: bool
+    incremental_transform: bool
     openai_api_key: str | None
     llm_model: str | None
     llm_base_url: str | None
@@ -52,11 +64,13 @@ class Args:
     rewrite: bool
     seasons: list[str] | None
     sentry_url: str
+    skip_sentiment: bool
     snapshot_tables: bool
     summarize_evals: bool
     sync_db_courses: bool
     sync_db_evals: bool
     transform: bool
+    transform_workers: int | None
     use_cache: bool
     freeze_locations: bool
     ycs_cookie: str | None
@@ -71,6 +85,8 @@ _PROJECT_DIR = Path(__file__).resolve().parent.parent
 
 DATA_DIR = str(_PROJECT_DIR / "data")
 
+CACHE_DIR = str(_PROJECT_DIR / "cache")
+
 
 def get_parser():
     parser = argparse.ArgumentParser(
@@ -78,12 +94,25 @@ def get_parser():
         formatter_class=argparse.ArgumentDefaultsHelpFormatter,
     )
 
+    parser.add_argument(
+        "--cache-dir",
+        help="Directory for local caches that are not part of the data, like the store of course detail responses. Keep it outside the data directory so the caches are not committed to ferry-data.",
+        default=CACHE_DIR,
+    )
+
     parser.add_argument(
         "--cas-cookie",
         help="CAS cookie. If not specified, defaults to the value of the CAS_COOKIE environment variable before prompting user.",
         default=None,
     )
 
+    parser.add_argument(
+        "--class-concurrency",
+        type=int,
+        help="Number of class requests in flight at once, across all seasons.",
+        default=32,
+    )
+
     parser.add_argument(
         "-f",
         "--config-file",
@@ -134,12 +163,31 @@ def get_parser():
         action="store_true",
     )
 
+    parser.add_argument(
+        "--eval-concurrency",
+        type=int,
+        help="Number of courses whose evaluations are fetched concurrently.",
+        default=8,
+    )
+
     parser.add_argument(
         "--generate-diagram",
         help="Generate database diagram.",
         action="store_true",
     )
 
+    parser.add_argument(
+        "--incremental",
+        help="Only fetch details for classes that are new or whose search results changed since the last crawl. Ignored if YCS credentials are provided.",
+        action="store_true",
+    )
+
+    parser.add_argument(
+        "--incremental-transform",
+        help="Make the transformer reuse same-course groups of courses that did not change since the last incremental transform. The groups are snapshotted in the cache directory.",
+        action="store_true",
+    )
+
     parser.add_argument(
         "-r",
         "--release",
@@ -191,9 +239,15 @@ def get_parser():
         default=None,
     )
 
+    parser.add_argument(
+        "--skip-sentiment",
+        help="Do not compute sentiment scores of evaluation comments in the transformer; they are all set to 0.",
+        action="store_true",
+    )
+
     parser.add_argument(
         "--snapshot-tables",
-        help="Generate CSV files capturing data that would be written to DB.",
+        help="Generate CSV and Parquet files capturing data that would be written to DB.",
         action="store_true",
     )
 
@@ -233,6 +287,13 @@ def get_parser():
         action="store_true",
     )
 
+    parser.add_argument(
+        "--transform-workers",
+        type=int,
+        help="Number of processes for same-course resolution and sentiment scoring in the transformer. Defaults to the number of CPUs.",
+        default=None,
+    )
+
     parser.add_argument(
         "--use-cache",
         help="Whether to use cache for requests. Automatically set to false in release mode.",
@@ -406,16 +467,20 @@ def save_yaml(args: RawArgs):
     del args.save_config
     config_file = args.config_file
     data_dir = str(args.data_dir)
+    cache_dir = str(args.cache_dir)
 
     del args.config_file
 
     if data_dir == DATA_DIR:
         del args.data_dir
+    if cache_dir == CACHE_DIR:
+        del args.cache_dir
 
     with open(config_file, "w+") as f:
         yaml.dump(vars(args), f)
 
     args.data_dir = data_dir
+    args.cache_dir = cache_dir
 
 
 def get_args() -> Args:
@@ -439,4 +504,5 @@ def get_args() -> Args:
     final_args = cast(Args, args)
 
     final_args.data_dir = Path(final_args.data_dir)
+    final_args.cache_dir = Path(final_args.cache_dir)
     return final_args
@@ -0,0 +1,207 @@
+"""
+Benchmark the crawlers against recorded responses instead of Yale.
+
+Serves the caches in `--data-dir` through `ReplayTransport`, runs each crawler
+stage with caching disabled (writing into a scratch directory), and reports
+requests/sec, p50/p99 latency and wall time for each stage.
+
+    python -m ferry.crawler.benchmark --data-dir data -s 202401 --latency 0.05
+"""
+
+import argparse
+import asyncio
+import tempfile
+import time
+import traceback
+from collections.abc import Awaitable, Callable
+from pathlib import Path
+from typing import Any
+
+from ferry.args_parser import DATA_DIR
+from ferry.crawler.cas_request import USER_AGENT
+from ferry.crawler.classes.fetch import (
+    CourseSearchClient,
+    fetch_all_season_courses_details,
+    fetch_cws_api,
+    fetch_season_course_list,
+)
+from ferry.crawler.evals import (
+    DEFAULT_EVAL_CONCURRENCY,
+    EXCLUDE_SEASONS_BEFORE,
+    crawl_evals,
+)
+from ferry.crawler.replay import ReplayTransport, RequestStats
+
+STAGES = ["season_courses", "course_details", "cws_api", "evals"]
+
+
+def get_parser():
+    parser = argparse.ArgumentParser(
+        description="Benchmark the crawlers against recorded responses.",
+        formatter_class=argparse.ArgumentDefaultsHelpFormatter,
+    )
+    parser.add_argument(
+        "--data-dir",
+        help="Directory with the recorded responses (usually a ferry-data clone).",
+        default=DATA_DIR,
+    )
+    parser.add_argument(
+        "-s", "--seasons", nargs="+", help="Seasons to crawl.", required=True
+    )
+    parser.add_argument(
+        "--stages",
+        nargs="+",
+        choices=STAGES,
+        default=STAGES,
+        help="Crawler stages to run.",
+    )
+    parser.add_argument(
+        "--latency", type=float, default=0.0, help="Response latency in seconds."
+    )
+    parser.add_argument(
+        "--jitter", type=float, default=0.0, help="Extra random latency in seconds."
+    )
+    parser.add_argument(
+        "--error-rate", type=float, default=0.0, help="Fraction of 500 responses."
+    )
+    parser.add_argument(
+        "--rate-limit-rate",
+        type=float,
+        default=0.0,
+        help="Fraction of 429 responses.",
+    )
+    parser.add_argument(
+        "--eval-concurrency",
+        type=int,
+        default=DEFAULT_EVAL_CONCURRENCY,
+        help="Number of courses whose evaluations are fetched concurrently.",
+    )
+    parser.add_argument("--seed", type=int, default=0, help="Random seed.")
+    return parser
+
+
+async def run_stage(
+    name: str,
+    transport: ReplayTransport,
+    run: Callable[[], Awaitable[Any]],
+) -> dict[str, Any]:
+    transport.stats = RequestStats()
+    start = time.perf_counter()
+    error = None
+    try:
+        await run()
+    except Exception as e:
+        traceback.print_exc()
+        error = f"{type(e).__name__}: {e}"
+    wall_time = time.perf_counter() - start
+    return {"stage": name, **transport.stats.summary(wall_time), "error": error}
+
+
+async def benchmark(
+    data_dir: Path,
+    seasons: list[str],
+    stages: list[str],
+    transport: ReplayTransport,
+    eval_concurrency: int,
+) -> list[dict[str, Any]]:
+    results: list[dict[str, Any]] = []
+    client = CourseSearchClient(
+        timeout=None, headers={"User-Agent": USER_AGENT}, transport=transport
+    )
+    season_courses: dict[str, list[dict[str, Any]]] = {}
+
+    async def crawl_season_courses():
+        for season in seasons:
+            season_courses[season] = await fetch_season_course_list(
+                season, data_dir=data_dir, client=client, use_cache=False
+            )
+            await fetch_season_course_list(
+                season, data_dir=data_dir, client=client, fysem=True, use_cache=False
+            )
+
+    # Later stages need the course lists, so always crawl them
+    results.append(await run_stage("season_courses", transport, crawl_season_courses))
+
+    async def crawl_course_details():
+        for season in seasons:
+            await fetch_all_season_courses_details(
+                season,
+                season_courses[season],
+                data_dir=data_dir,
+                cache_dir=data_dir,
+                client=client,
+                use_cache=False,
+            )
+
+    async def crawl_cws_api():
+        for season in seasons:
+            await fetch_cws_api(
+                season,
+                season_courses[season],
+                data_dir=data_dir,
+                client=client,
+                cws_api_key="replay",
+                use_cache=False,
+            )
+
+    async def crawl_oce():
+        await crawl_evals(
+            cas_cookie="replay",
+            seasons=[x for x in seasons if int(x) > int(EXCLUDE_SEASONS_BEFORE)],
+            data_dir=data_dir,
+            concurrency=eval_concurrency,
+            transport=transport,
+        )
+
+    for name, run in [
+        ("course_details", crawl_course_details),
+        ("cws_api", crawl_cws_api),
+        ("evals", crawl_oce),
+    ]:
+        if name in stages:
+            results.append(await run_stage(name, transport, run))
+
+    await client.aclose()
+    return results
+
+
+def print_results(results: list[dict[str, Any]]):
+    print(
+        f"{'stage':<16}{'requests':>10}{'req/s':>10}{'p50 ms':>10}{'p99 ms':>10}"
+        + f"{'wall s':>10}  status codes"
+    )
+    for r in results:
+        print(
+            f"{r['stage']:<16}{r['requests']:>10}{r['requests_per_sec']:>10.1f}"
+            + f"{r['p50_ms']:>10.1f}{r['p99_ms']:>10.1f}{r['wall_time_s']:>10.2f}"
+            + f"  {r['status_codes']}"
+            + (f"  FAILED: {r['error']}" if r["error"] else "")
+        )
+
+
+def main():
+    args = get_parser().parse_args()
+    transport = ReplayTransport(
+        Path(args.data_dir),
+        latency=args.latency,
+        jitter=args.jitter,
+        error_rate=args.error_rate,
+        rate_limit_rate=args.rate_limit_rate,
+        seed=args.seed,
+    )
+    # Crawlers write their caches as they go; keep them out of the recorded data
+    with tempfile.TemporaryDirectory() as scratch_dir:
+        results = asyncio.run(
+            benchmark(
+                Path(scratch_dir),
+                args.seasons,
+                args.stages,
+                transport,
+                args.eval_concurrency,
+            )
+        )
+    print_results(results)
+
+
+if __name__ == "__main__":
+    main()
@@ -1,3 +1,7 @@
+import json
+import os
+import textwrap
+from collections.abc import Iterator
 from pathlib import Path
 from typing import Any
 
@@ -48,3 +52,98 @@ def save_cache_json(
 
     with open(path, "w") as f:
         ujson.dump(data, f, indent=indent)
+
+
+def iter_cache_json(path: Path, chunk_size: int = 1 << 16) -> Iterator[Any]:
+    """
+    Iterate over the records of a JSON list cache file without loading the
+    whole list.
+
+    Parameters
+    ----------
+    path: str
+        Path to cache file, which must contain a JSON list
+    chunk_size: int = 65536
+        Number of characters read from the file at once
+
+    Yields
+    ------
+    record: Any
+        Each element of the list, in order
+    """
+    decoder = json.JSONDecoder()
+
+    with open(path) as f:
+        buffer = f.read(chunk_size).lstrip()
+        if not buffer.startswith("["):
+            raise ValueError(f"{path} does not contain a JSON list")
+        buffer = buffer[1:]
+        eof = False
+        while True:
+            buffer = buffer.lstrip()
+            if buffer.startswith(","):
+                buffer = buffer[1:].lstrip()
+            if buffer.startswith("]"):
+                return
+            # A record is only known to be complete once the separator after it
+            # has been read; otherwise it may be cut off by the end of the
+            # chunk (e.g. in the middle of a number)
+            try:
+                record, end = decoder.raw_decode(buffer)
+                complete = buffer[end:].lstrip()[:1] in (",", "]")
+            except json.JSONDecodeError:
+                complete = False
+            if not complete:
+                if eof:
+                    raise ValueError(f"{path} does not contain a valid JSON list")
+                chunk = f.read(chunk_size)
+                eof = not chunk
+                buffer += chunk
+                continue
+            yield record
+            buffer = buffer[end:]
+
+
+class CacheJsonWriter:
+    """
+    Write a JSON list to a cache file one record at a time, so the list never
+    has to be held (or serialized) in memory at once. The file is identical to
+    what `save_cache_json` writes for the same list, and only replaces the
+    existing file once the writer is closed without an error.
+
+        with CacheJsonWriter(path) as writer:
+            for record in records:
+                writer.write(record)
+    """
+
+    def __init__(self, path: Path):
+        path.parent.mkdir(parents=True, exist_ok=True)
+        self.path = path
+        self.temp_path = path.with_name(f".{path.name}.tmp")
+        self.file = open(self.temp_path, "w")
+        self.count = 0
+
+    def write(self, record: Any):
+        import ujson
+
+        self.file.write(",\n" if self.count else "[\n")
+        self.file.write(textwrap.indent(ujson.dumps(record, indent=4), "    "))
+        self.count += 1
+
+    def close(self):
+        self.file.write("\n]" if self.count else "[]")
+        self.file.close()
+        os.replace(self.temp_path, self.path)
+
+    def abort(self):
+        self.file.close()
+        self.temp_path.unlink(missing_ok=True)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        if exc_type is None:
+            self.close()
+        else:
+            self.abort()
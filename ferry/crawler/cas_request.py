@@ -3,72 +3,175 @@ Functions for authenticating with Yale Central Authentication System (CAS).
 """
 
 import asyncio
-import os
+import email.utils
 import time
 
 import httpx
-import requests
 
 # User-Agent header to avoid AWS WAF challenges
 USER_AGENT = "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/143.0.0.0 Safari/537.36"
 
+# HostRateLimiter adjustments: until the first 429 the rate doubles about
+# every second; after that it grows by RATE_INCREASE requests/sec for about
+# every second of healthy responses. Each 429 multiplies it by RATE_DECREASE,
+# down to MIN_REQUESTS_PER_SECOND
+RATE_INCREASE = 5
+RATE_DECREASE = 0.5
+MIN_REQUESTS_PER_SECOND = 0.5
 
-class RateLimitError(Exception):
-    pass
 
+class CASClient(httpx.AsyncClient):
+    """
+    HTTPX AsyncClient that sends the CAS cookie with every request. Each
+    response is buffered on its own, so the client is safe to share between
+    concurrent requests.
+    """
 
-class CASClient(requests.Session):
-    def __init__(self, cas_cookie: str):
-        super().__init__()
+    def __init__(
+        self,
+        cas_cookie: str,
+        max_connections: int = 16,
+        transport: httpx.AsyncBaseTransport | None = None,
+    ):
+        super().__init__(
+            headers={"User-Agent": USER_AGENT, "Cookie": cas_cookie},
+            limits=httpx.Limits(max_connections=max_connections),
+            timeout=httpx.Timeout(60),
+            transport=transport,
+        )
         self.cas_cookie = cas_cookie
 
 
-def sync_request(
-    url: str,
-    client: CASClient,
-    attempts: int = 1,
-    **kwargs,
-):
+class HostState:
+    def __init__(self, rate: float):
+        # current requests per second
+        self.rate = rate
+        # ramp up exponentially until the host first pushes back
+        self.slow_start = True
+        # earliest event loop time the next request may start
+        self.next_slot = 0.0
+        # no request may start before this event loop time
+        self.paused_until = 0.0
+        self.requests = 0
+        self.retries = 0
+        # total time the host was paused after failures
+        self.throttled_time = 0.0
+
+
+class HostRateLimiter:
     """
-    Helper function to make a request with retries (exponential backoff)
+    Adaptive (AIMD) rate limiter for each host, shared by all concurrent
+    requests.
+
+    Requests to each host are spaced out to the host's current rate. Healthy
+    responses raise the rate, up to `max_requests_per_second`, and a 429 halves
+    it. Any failure (429, 5xx or connection error) pauses the whole host, not
+    just the request that failed.
 
     Parameters
     ----------
-    method: str
-        HTTP method
-    url: str
-        URL
-    client: Client
-        HTTPX Client
-    attempts: int = 1
-        Number of attempts
-    **kwargs
-        Additional keyword arguments for client.request
+    requests_per_second:
+        Rate each host starts at.
+    max_requests_per_second:
+        Rate a host may ramp up to. Defaults to `requests_per_second`, so the
+        rate only recovers after a back-off and never exceeds the initial rate.
     """
 
-    attempt = 0
-    response = None
-
-    while response is None and attempt < attempts:
-        try:
-            # Non-ideal but works for now
-            os.system(
-                f'curl -s -f -H "Cookie: {client.cas_cookie}" "{url}" -o /tmp/out'
+    def __init__(
+        self,
+        requests_per_second: float,
+        max_requests_per_second: float | None = None,
+    ):
+        self.initial_rate = requests_per_second
+        self.max_rate = max_requests_per_second or requests_per_second
+        self.hosts: dict[str, HostState] = {}
+
+    def host(self, url: str) -> HostState:
+        host = httpx.URL(url).host
+        if host not in self.hosts:
+            self.hosts[host] = HostState(self.initial_rate)
+        return self.hosts[host]
+
+    async def wait(self, url: str):
+        state = self.host(url)
+        loop = asyncio.get_running_loop()
+        while True:
+            now = loop.time()
+            slot = max(now, state.next_slot)
+            state.next_slot = slot + 1 / state.rate
+            if slot > now:
+                await asyncio.sleep(slot - now)
+            # the host may have been paused while we waited for our slot
+            if loop.time() >= state.paused_until:
+                return
+
+    def on_success(self, url: str):
+        state = self.host(url)
+        state.requests += 1
+        # successes arrive `rate` times per second, so this adds about `rate`
+        # (slow start) or RATE_INCREASE per second
+        increase = 1 if state.slow_start else RATE_INCREASE / state.rate
+        state.rate = min(self.max_rate, state.rate + increase)
+
+    def back_off(self, url: str, delay: float, throttled: bool = True):
+        """
+        Pause the host for `delay` seconds. If the host `throttled` us (429),
+        also lower its rate.
+        """
+        state = self.host(url)
+        state.requests += 1
+        state.retries += 1
+        now = asyncio.get_running_loop().time()
+        # requests in flight when the host started throttling don't count again
+        if throttled and now >= state.paused_until:
+            state.slow_start = False
+            state.rate = max(MIN_REQUESTS_PER_SECOND, state.rate * RATE_DECREASE)
+        resume = now + delay
+        if resume > state.paused_until:
+            state.throttled_time += resume - max(now, state.paused_until)
+            state.paused_until = resume
+        state.next_slot = max(state.next_slot, resume)
+
+    def metrics(self) -> dict[str, dict[str, float]]:
+        return {
+            host: {
+                "requests_per_second": state.rate,
+                "requests": state.requests,
+                "retries": state.retries,
+                "throttled_time": state.throttled_time,
+            }
+            for host, state in self.hosts.items()
+        }
+
+    def print_metrics(self):
+        for host, metrics in self.metrics().items():
+            print(
+                f"{host}: {metrics['requests']} requests, "
+                + f"{metrics['retries']} retries, "
+                + f"throttled for {metrics['throttled_time']:.1f}s, "
+                + f"ending at {metrics['requests_per_second']:.1f} requests/s"
             )
-            with open("/tmp/out", "rb") as file:
-                response = file.read()
-                if (
-                    "The requested URL returned error" in str(response)
-                    or len(str(response)) == 0
-                ):
-                    response = None
-        except:
-            time.sleep(2**attempt)
-            attempt += 1
-
-    if response is None:
-        raise ValueError("Request failed: all attempts exhausted.")
-    return response
+
+
+def parse_retry_after(response: httpx.Response) -> float | None:
+    """
+    Seconds to wait according to the Retry-After header, which is either a
+    number of seconds or an HTTP date.
+    """
+    retry_after = response.headers.get("Retry-After")
+    if retry_after is None:
+        return None
+    try:
+        return max(0.0, float(retry_after))
+    except ValueError:
+        pass
+    try:
+        return max(
+            0.0,
+            email.utils.parsedate_to_datetime(retry_after).timestamp() - time.time(),
+        )
+    except (TypeError, ValueError):
+        return None
 
 
 async def request(
@@ -76,11 +179,16 @@ async def request(
     url: str,
     client: httpx.AsyncClient,
     attempts: int = 1,
+    rate_limiter: HostRateLimiter | None = None,
     **kwargs,
 ):
     """
     Helper function to make a request with retries (exponential backoff)
 
+    429s, 5xx responses and connection errors are retried, waiting for the
+    server's Retry-After if it sent one. A 5xx on the last attempt is returned
+    for the caller to handle.
+
     Parameters
     ----------
     method: str
@@ -91,22 +199,44 @@ async def request(
         HTTPX AsyncClient
     attempts: int = 1
         Number of attempts
+    rate_limiter: HostRateLimiter | None = None
+        Shared limiter to wait on before each attempt. Failed attempts back off
+        the whole host instead of just this request.
     **kwargs
         Additional keyword arguments for client.request
     """
 
     attempt = 0
-    response = None
 
-    while response is None and attempt < attempts:
+    while attempt < attempts:
+        if rate_limiter is not None:
+            await rate_limiter.wait(url)
         try:
             response = await client.request(method, url, **kwargs)
-            if response.status_code == 429:
-                raise RateLimitError()
-        except:
-            await asyncio.sleep(2**attempt)
-            attempt += 1
-
-    if response is None:
-        raise ValueError("Request failed: all attempts exhausted.")
-    return response
+        except httpx.HTTPError:
+            delay = 2**attempt
+            throttled = False
+        else:
+            if response.status_code != 429 and response.status_code < 500:
+                if rate_limiter is not None:
+                    rate_limiter.on_success(url)
+                return response
+            delay = parse_retry_after(response)
+            # Retry-After: 0 is a valid request to retry right away
+            if delay is None:
+                delay = 2**attempt
+            throttled = response.status_code == 429
+            # leave server errors to the caller once out of attempts
+            if not throttled and attempt == attempts - 1:
+                if rate_limiter is not None:
+                    rate_limiter.back_off(url, delay, throttled)
+                return response
+
+        attempt += 1
+        if rate_limiter is not None:
+            # the next wait() on this host sleeps until the back-off is over
+            rate_limiter.back_off(url, delay, throttled)
+        elif attempt < attempts:
+            await asyncio.sleep(delay)
+
+    raise ValueError("Request failed: all attempts exhausted.")
@@ -1,78 +1,130 @@
+import asyncio
+import concurrent.futures
 from pathlib import Path
+from typing import Any
 
-from httpx import AsyncClient
-from tqdm import tqdm
+from tqdm.asyncio import tqdm_asyncio
+
+from ferry.crawler.cas_request import HostRateLimiter
 
 from .fetch import (
+    CLASS_MAX_REQUESTS_PER_SECOND,
+    CLASS_REQUESTS_PER_SECOND,
+    DEFAULT_CLASS_CONCURRENCY,
+    CourseSearchClient,
     fetch_all_season_courses_details,
     fetch_cws_api,
     fetch_season_course_list,
 )
-from .parse import ParsedCourse, parse_courses
+from .parse import parse_courses
 
 
 async def crawl_classes(
     seasons: list[str],
     data_dir: Path,
-    client: AsyncClient,
+    cache_dir: Path,
+    client: CourseSearchClient,
     cws_api_key: str,
     use_cache: bool = True,
     pers: dict | None = None,
     cookie_header: str | None = None,
-) -> dict[str, list[ParsedCourse]]:
-    # Concurrency with async at the season level overloads the CPU
-    # futures = [ fetch_class(season, data_dir=data_dir, client=client) for season in seasons ]
-    # classes = await tqdm_asyncio.gather(*futures, desc="Season Progress")
+    incremental: bool = False,
+    concurrency: int = DEFAULT_CLASS_CONCURRENCY,
+) -> dict[str, Path]:
+    """
+    Fetch and parse classes for all `seasons`, and return the path of each
+    season's `parsed_courses/{season}.json`.
 
+    Seasons are crawled concurrently, but at most `concurrency` requests are in
+    flight across all of them. Parsing runs in worker processes so it doesn't
+    stall the fetches of other seasons. Course details are streamed between
+    the stages through their cache files instead of being returned as lists,
+    so no season is held in memory at once.
+    """
     print(f"Fetching course info for seasons: {seasons}...")
 
-    classes: dict[str, list[ParsedCourse]] = {}
-    for season in tqdm(seasons, desc="Season Progress", leave=False):
-        season_courses = await fetch_season_course_list(
-            season, data_dir=data_dir, client=client, use_cache=use_cache
-        )
-        season_fysem_courses = await fetch_season_course_list(
-            season,
-            data_dir=data_dir,
-            client=client,
-            fysem=True,
-            use_cache=use_cache,
-        )
-
-        aggregate_season_json = await fetch_all_season_courses_details(
-            season,
-            season_courses,
-            data_dir=data_dir,
-            client=client,
-            use_cache=use_cache,
-            pers=pers,
-            cookie_header=cookie_header,
-        )
+    semaphore = asyncio.Semaphore(concurrency)
+    rate_limiter = HostRateLimiter(
+        CLASS_REQUESTS_PER_SECOND, CLASS_MAX_REQUESTS_PER_SECOND
+    )
+    loop = asyncio.get_running_loop()
 
-        cws_season_json = []
+    async def fetch_cws_or_empty(
+        season: str, season_courses: list[dict[str, Any]]
+    ) -> list[dict[str, Any]]:
         try:
-            cws_season_json = await fetch_cws_api(
+            return await fetch_cws_api(
                 season,
                 season_courses,
                 data_dir=data_dir,
                 cws_api_key=cws_api_key,
                 client=client,
                 use_cache=use_cache,
+                semaphore=semaphore,
+                rate_limiter=rate_limiter,
             )
         except:
             print(f"Failed to fetch CWS API for {season}.\n Continuing...")
-            pass
+            return []
 
-        classes[season] = parse_courses(
+    async def crawl_season(season: str, executor: concurrent.futures.Executor) -> Path:
+        async with semaphore:
+            season_courses = await fetch_season_course_list(
+                season,
+                data_dir=data_dir,
+                client=client,
+                use_cache=use_cache,
+                rate_limiter=rate_limiter,
+            )
+        async with semaphore:
+            season_fysem_courses = await fetch_season_course_list(
+                season,
+                data_dir=data_dir,
+                client=client,
+                fysem=True,
+                use_cache=use_cache,
+                rate_limiter=rate_limiter,
+            )
+
+        details_path, cws_season_json = await asyncio.gather(
+            fetch_all_season_courses_details(
+                season,
+                season_courses,
+                data_dir=data_dir,
+                cache_dir=cache_dir,
+                client=client,
+                use_cache=use_cache,
+                pers=pers,
+                cookie_header=cookie_header,
+                incremental=incremental,
+                semaphore=semaphore,
+                rate_limiter=rate_limiter,
+            ),
+            fetch_cws_or_empty(season, season_courses),
+        )
+
+        return await loop.run_in_executor(
+            executor,
+            parse_courses,
             season,
-            aggregate_season_json,
+            details_path,
             cws_season_json,
             set(x["crn"] for x in season_fysem_courses),
-            data_dir=data_dir,
-            use_cache=use_cache,
+            data_dir,
+            use_cache,
+        )
+
+    with concurrent.futures.ProcessPoolExecutor() as executor:
+        parsed_seasons = await tqdm_asyncio.gather(
+            *[crawl_season(season, executor) for season in seasons],
+            desc="Season Progress",
+            leave=False,
         )
+    classes = dict(zip(seasons, parsed_seasons, strict=True))
 
     print("\033[F", end="")
     print(f"Fetching course info for seasons: {seasons}... ✔")
+    rate_limiter.print_metrics()
+    print(f"Session warm-up requests: {client.warm_up_requests}")
 
     return classes
@@ -1,4 +1,8 @@
+import asyncio
+import datetime
+import hashlib
 import itertools
+import zlib
 from pathlib import Path
 from typing import Any
 
@@ -7,7 +11,17 @@ from httpx import AsyncClient
 from tqdm.asyncio import tqdm_asyncio
 
 from ferry.crawler.cache import load_cache_json, save_cache_json
-from ferry.crawler.cas_request import request
+from ferry.crawler.cas_request import HostRateLimiter, request
+from ferry.crawler.response_store import ResponseStore
+
+# Requests to Yale Course Search and the CourseWebService API in flight at once,
+# unless the caller shares a semaphore across seasons
+DEFAULT_CLASS_CONCURRENCY = 32
+
+# Requests started per second against each host; the rate starts low and ramps
+# up while responses are healthy
+CLASS_REQUESTS_PER_SECOND = 20
+CLASS_MAX_REQUESTS_PER_SECOND = 200
 
 
 # fetch overview info for all classes in each season
@@ -17,6 +31,7 @@ async def fetch_season_course_list(
     client: AsyncClient,
     fysem: bool = False,
     use_cache: bool = True,
+    rate_limiter: HostRateLimiter | None = None,
 ) -> list[dict[str, Any]]:
     if fysem:
         criteria = [{"field": "fsem_attrs", "value": "Y"}]
@@ -42,7 +57,12 @@ async def fetch_season_course_list(
     payload = {"other": {"srcdb": season}, "criteria": criteria}
 
     req = await request(
-        method="POST", client=client, url=url, data=ujson.dumps(payload)
+        method="POST",
+        client=client,
+        url=url,
+        data=ujson.dumps(payload),
+        attempts=5,
+        rate_limiter=rate_limiter,
     )
     req.encoding = "utf-8"
 
@@ -69,13 +89,45 @@ class FetchClassesError(Exception):
     pass
 
 
+class CourseSearchClient(AsyncClient):
+    """
+    HTTPX AsyncClient for Yale Course Search. Detail requests need the site's
+    cookies, which `warm_up` obtains once for all concurrent requests.
+    """
+
+    def __init__(self, **kwargs):
+        super().__init__(**kwargs)
+        self.warm_up_lock = asyncio.Lock()
+        self.warmed_up = False
+        # number of homepage requests made to warm up the session
+        self.warm_up_requests = 0
+
+    async def warm_up(self, rate_limiter: HostRateLimiter | None = None):
+        # Everyone waits for the first request; later ones only retry if it failed
+        async with self.warm_up_lock:
+            if self.warmed_up or self.cookies:
+                return
+            self.warm_up_requests += 1
+            try:
+                await request(
+                    method="GET",
+                    client=self,
+                    url="https://courses.yale.edu/",
+                    rate_limiter=rate_limiter,
+                )
+                self.warmed_up = True
+            except Exception:
+                pass
+
+
 async def fetch_course_details(
     code: str,
     crn: str,
     season_code: str,
-    client: AsyncClient,
+    client: CourseSearchClient,
     pers: dict | None = None,
     cookie_header: str | None = None,
+    rate_limiter: HostRateLimiter | None = None,
 ) -> dict[str, Any]:
     """
     Fetch information for a course from the API
@@ -110,12 +162,9 @@ async def fetch_course_details(
     else:
         payload["_pers"] = {}
 
-    # Warm session to obtain site cookies if the client has none and no explicit cookie provided
-    try:
-        if cookie_header is None and (not client.cookies):
-            await client.get("https://courses.yale.edu/")
-    except Exception:
-        pass
+    # Warm session to obtain site cookies if no explicit cookie provided
+    if cookie_header is None:
+        await client.warm_up(rate_limiter)
 
     # retry up to 10 times
     headers = {
@@ -137,6 +186,7 @@ async def fetch_course_details(
         data=ujson.dumps(payload),
         headers=headers,
         attempts=10,
+        rate_limiter=rate_limiter,
     )
 
     req.encoding = "utf-8"
@@ -157,7 +207,12 @@ async def fetch_course_details(
 
 
 async def fetch_cws_api_school_subject(
-    school: str, subject: str, season_code: str, client: AsyncClient, cws_api_key: str
+    school: str,
+    subject: str,
+    season_code: str,
+    client: AsyncClient,
+    cws_api_key: str,
+    rate_limiter: HostRateLimiter | None = None,
 ):
     url = "https://gw.its.yale.edu/soa-gateway/courses/webservice/v3/index"
 
@@ -172,6 +227,8 @@ async def fetch_cws_api_school_subject(
             "mode": "json",
             "school": school,
         },
+        attempts=5,
+        rate_limiter=rate_limiter,
     )
     req.encoding = "utf-8"
 
@@ -191,6 +248,8 @@ async def fetch_cws_api(
     client: AsyncClient,
     cws_api_key: str,
     use_cache: bool = True,
+    semaphore: asyncio.Semaphore | None = None,
+    rate_limiter: HostRateLimiter | None = None,
 ):
     # load from cache if it exists
     if (
@@ -207,9 +266,17 @@ async def fetch_cws_api(
         (course["col"], course["code"].split(" ")[0]) for course in season_courses
     )
 
+    if semaphore is None:
+        semaphore = asyncio.Semaphore(DEFAULT_CLASS_CONCURRENCY)
+
+    async def fetch_school_subject(school: str, subject: str):
+        async with semaphore:
+            return await fetch_cws_api_school_subject(
+                school, subject, season, client, cws_api_key, rate_limiter
+            )
+
     futures = [
-        fetch_cws_api_school_subject(school, subject, season, client, cws_api_key)
-        for school, subject in school_subjects
+        fetch_school_subject(school, subject) for school, subject in school_subjects
     ]
 
     aggregate_season_json = await tqdm_asyncio.gather(
@@ -223,46 +290,124 @@ async def fetch_cws_api(
     return data
 
 
+# In incremental mode, courses whose search row is unchanged are still
+# re-fetched once every this many days, so detail-only changes (descriptions,
+# requirements, ...) are eventually picked up
+INCREMENTAL_REFRESH_DAYS = 7
+
+
+def fingerprint_course(course: dict[str, Any]) -> str:
+    """
+    Hash a search result row, to tell whether a course changed since the last
+    crawl without fetching its details.
+    """
+    return hashlib.sha256(ujson.dumps(course, sort_keys=True).encode()).hexdigest()
+
+
+def is_scheduled_refresh(crn: str) -> bool:
+    day = datetime.date.today().toordinal() % INCREMENTAL_REFRESH_DAYS
+    return zlib.crc32(crn.encode()) % INCREMENTAL_REFRESH_DAYS == day
+
+
 # fetch detailed info for all classes in each season
 async def fetch_all_season_courses_details(
     season: str,
     season_courses: list[dict[str, Any]],
     data_dir: Path,
-    client: AsyncClient,
+    cache_dir: Path,
+    client: CourseSearchClient,
     use_cache: bool = True,
     pers: dict | None = None,
     cookie_header: str | None = None,
-):
-    # load from cache if it exists
-    if (
-        use_cache
-        and (
-            cache_load := load_cache_json(
-                data_dir / "course_json_cache" / f"{season}.json"
+    incremental: bool = False,
+    semaphore: asyncio.Semaphore | None = None,
+    rate_limiter: HostRateLimiter | None = None,
+) -> Path:
+    """
+    Fetch the details of `season_courses` and merge them, in order, into
+    `course_json_cache/{season}.json`. Returns the path of that file, which is
+    meant to be streamed with `iter_cache_json`.
+    """
+    # Each response is stored as soon as it arrives, so an interrupted crawl
+    # can be resumed with use_cache. The store lives outside the data directory,
+    # whose per-season JSON (possibly newer, e.g. after a pull) always wins.
+    store = ResponseStore(cache_dir / "course_json_store.sqlite")
+    details_cache = data_dir / "course_json_cache" / f"{season}.json"
+    try:
+        if use_cache:
+            store.sync_season(season, details_cache)
+            stored_crns = store.crns(season)
+            courses_to_fetch = [
+                course for course in season_courses if course["crn"] not in stored_crns
+            ]
+        elif (
+            incremental
+            and details_cache.is_file()
+            and (
+                previous_fingerprints := load_cache_json(
+                    data_dir / "course_fingerprints" / f"{season}.json"
+                )
+            )
+            is not None
+        ):
+            # The previous details and fingerprints are saved together, so
+            # they describe the same crawl
+            store.sync_season(season, details_cache)
+            courses_to_fetch = [
+                course
+                for course in season_courses
+                if previous_fingerprints.get(course["crn"])
+                != fingerprint_course(course)
+                or is_scheduled_refresh(course["crn"])
+            ]
+            print(
+                f"Season {season}: fetching details for {len(courses_to_fetch)} "
+                + f"of {len(season_courses)} courses (new, changed or scheduled)"
+            )
+        else:
+            courses_to_fetch = season_courses
+
+        if semaphore is None:
+            semaphore = asyncio.Semaphore(DEFAULT_CLASS_CONCURRENCY)
+
+        async def fetch_and_store(course: dict[str, Any]):
+            async with semaphore:
+                course_json = await fetch_course_details(
+                    course["code"],
+                    course["crn"],
+                    course["srcdb"],
+                    client=client,
+                    pers=pers,
+                    cookie_header=cookie_header,
+                    rate_limiter=rate_limiter,
+                )
+            store.put(season, course["crn"], course_json)
+
+        tasks = [
+            asyncio.ensure_future(fetch_and_store(course))
+            for course in courses_to_fetch
+        ]
+        try:
+            await tqdm_asyncio.gather(
+                *tasks, leave=False, desc=f"Fetching season {season}"
             )
+        finally:
+            # if one fetch fails, don't leave the rest writing to a closed store
+            for task in tasks:
+                task.cancel()
+
+        # merge all the JSON results per season
+        store.export_season(
+            season,
+            [course["crn"] for course in season_courses],
+            details_cache,
         )
-        is not None
-    ):
-        return cache_load
-
-    # merge all the JSON results per season
-    futures = [
-        fetch_course_details(
-            course["code"],
-            course["crn"],
-            course["srcdb"],
-            client=client,
-            pers=pers,
-            cookie_header=cookie_header,
+        # Only written once the details are saved, so an interrupted crawl
+        # never marks a course as up to date
+        save_cache_json(
+            data_dir / "course_fingerprints" / f"{season}.json",
+            {course["crn"]: fingerprint_course(course) for course in season_courses},
         )
-        for course in season_courses
-    ]
-    aggregate_season_json = await tqdm_asyncio.gather(
-        *futures, leave=False, desc=f"Fetching season {season}"
-    )
-
-    save_cache_json(
-        data_dir / "course_json_cache" / f"{season}.json", aggregate_season_json
-    )
-
-    return aggregate_season_json
+        return details_cache
+    finally:
+        store.close()
@@ -10,7 +10,7 @@ from bs4 import BeautifulSoup, MarkupResemblesLocatorWarning, ResultSet, Tag
 from tqdm import tqdm
 from unidecode import unidecode
 
-from ferry.crawler.cache import load_cache_json, save_cache_json
+from ferry.crawler.cache import CacheJsonWriter, iter_cache_json
 
 warnings.filterwarnings("ignore", category=MarkupResemblesLocatorWarning, module="bs4")
 
@@ -616,44 +616,40 @@ def extract_course_info(
 # combine regular and fysem courses in each season
 def parse_courses(
     season: str,
-    aggregate_season_courses: list[dict[str, Any]],
+    details_path: Path,
     cws_season_json: list[dict[str, Any]],
     fysem_courses: set[str],
     data_dir: Path,
     use_cache: bool = True,
-) -> list[ParsedCourse]:
-    # load from cache if it exists
-    if (
-        use_cache
-        and (
-            cache_load := load_cache_json(
-                data_dir / "parsed_courses" / f"{season}.json"
-            )
-        )
-        is not None
-    ):
-        return cache_load
+) -> Path:
+    """
+    Parse the course details in `details_path` into
+    `parsed_courses/{season}.json` and return its path. Courses are read and
+    written one at a time, so neither list is ever held in memory.
+    """
+    parsed_path = data_dir / "parsed_courses" / f"{season}.json"
+    # reuse the cache if it exists
+    if use_cache and parsed_path.is_file():
+        return parsed_path
 
     # parse course JSON in season
-    parsed_course_info: list[ParsedCourse] = []
     cws_data = {x["crn"]: x for x in cws_season_json}
     cws_data_by_code = {}
     for x in cws_season_json:
         cws_data_by_code.setdefault(x["subjectNumber"], []).append(x)
     # not worth parallelizing, already pretty quick
-    for x in tqdm(
-        aggregate_season_courses, leave=False, desc=f"Parsing season {season}"
-    ):
-        try:
-            parsed_course_info.append(
-                extract_course_info(
+    with CacheJsonWriter(parsed_path) as writer:
+        for x in tqdm(
+            iter_cache_json(details_path), leave=False, desc=f"Parsing season {season}"
+        ):
+            try:
+                course_info = extract_course_info(
                     x, season, fysem_courses, cws_data, cws_data_by_code
                 )
-            )
-        except Exception as e:
-            print(f"Error parsing course {x['code']} in season {season}: {e}")
-            traceback.print_exc()
-
-    save_cache_json(data_dir / "parsed_courses" / f"{season}.json", parsed_course_info)
+            except Exception as e:
+                print(f"Error parsing course {x['code']} in season {season}: {e}")
+                traceback.print_exc()
+                continue
+            writer.write(course_info)
 
-    return parsed_course_info
+    return parsed_path
@@ -1,27 +1,48 @@
+import asyncio
 import concurrent.futures
+import itertools
+from collections.abc import Iterable
 from pathlib import Path
 
 import diskcache
 import httpx
 from tqdm import tqdm
+from tqdm.asyncio import tqdm_asyncio
 
-from ferry.crawler.cache import load_cache_json, save_cache_json
-from ferry.crawler.cas_request import USER_AGENT, CASClient
+from ferry.crawler.cache import CacheJsonWriter, load_cache_json
+from ferry.crawler.cas_request import USER_AGENT, CASClient, HostRateLimiter
 from ferry.crawler.classes.parse import ParsedCourse
 
 from .fetch import FetchError, fetch_course_evals
-from .parse import parse_eval_page
+from .parse import ParsedEval, parse_eval_pages
 
 # exclude seasons before and including this because no evaluations
 EXCLUDE_SEASONS_BEFORE = "202101"
 
+# Number of fetched pages to send to a worker process at once
+PARSE_CHUNK_SIZE = 32
+
+# Default number of courses whose evals are fetched at once
+DEFAULT_EVAL_CONCURRENCY = 8
+
+# Requests started per second against each host (OCE and Yale Course Search)
+EVAL_REQUESTS_PER_SECOND = 10
+
 
 async def crawl_evals(
     cas_cookie: str,
     seasons: list[str],
     data_dir: Path,
-    courses: dict[str, list[ParsedCourse]] | None = None,
+    courses: dict[str, Iterable[ParsedCourse]] | None = None,
+    concurrency: int = DEFAULT_EVAL_CONCURRENCY,
+    transport: httpx.AsyncBaseTransport | None = None,
 ):
+    """
+    Fetch and parse evals for all courses in `seasons`.
+
+    `transport` replaces the network for both the course search and OCE clients;
+    it is only used to run the crawler against recorded responses.
+    """
     # -----------------------------------
     # Queue courses to query from seasons
     # -----------------------------------
@@ -49,10 +70,32 @@ async def crawl_evals(
     print(f"Fetching course evals for valid seasons: {seasons}...")
 
     # initiate Yale client session to access evals
-    client = httpx.AsyncClient(headers={"User-Agent": USER_AGENT})
-    cas_client = CASClient(cas_cookie=cas_cookie)
-
-    # Season level is synchronous, following same logic as class fetcher
+    client = httpx.AsyncClient(headers={"User-Agent": USER_AGENT}, transport=transport)
+    cas_client = CASClient(
+        cas_cookie=cas_cookie, max_connections=concurrency, transport=transport
+    )
+    rate_limiter = HostRateLimiter(EVAL_REQUESTS_PER_SECOND)
+    semaphore = asyncio.Semaphore(concurrency)
+
+    loop = asyncio.get_running_loop()
+
+    async def fetch_course(
+        season: str, crn: str, yale_college_cache: diskcache.Cache
+    ) -> tuple[bytes | None, str]:
+        async with semaphore:
+            return await fetch_course_evals(
+                season_code=season,
+                crn=crn,
+                data_dir=data_dir,
+                client=client,
+                cas_client=cas_client,
+                yale_college_cache=yale_college_cache,
+                rate_limiter=rate_limiter,
+            )
+
+    # Season level is synchronous; courses within a season are fetched concurrently.
+    # Parsing is CPU-bound, so pages are handed to worker processes in chunks
+    # as soon as they are fetched, overlapping with the remaining fetches.
     with concurrent.futures.ProcessPoolExecutor() as executor:
         for season in (pbar := tqdm(seasons, desc="Season Progress", leave=False)):
             pbar.set_postfix({"season": season})
@@ -69,29 +112,45 @@ async def crawl_evals(
                 )
 
             yale_college_cache = diskcache.Cache(data_dir / "yale_college_cache")
-            raw_course_evals: list[tuple[bytes | None, str]] = []
-
-            for course in tqdm(season_courses, desc="Course Progress", leave=False):
-                raw_course_evals.append(
-                    await fetch_course_evals(
-                        season_code=season,
-                        crn=course["crn"],
-                        data_dir=data_dir,
-                        client=client,
-                        cas_client=cas_client,
-                        yale_college_cache=yale_college_cache,
+            parse_futures: list[asyncio.Future[list[ParsedEval]]] = []
+            chunk: list[tuple[bytes, str]] = []
+
+            # At most `concurrency` courses are in flight; pages are queued for
+            # parsing in completion order
+            for fetched in tqdm_asyncio.as_completed(
+                [
+                    fetch_course(season, course["crn"], yale_college_cache)
+                    for course in season_courses
+                ],
+                desc="Course Progress",
+                leave=False,
+            ):
+                page, crn = await fetched
+                if page is None:
+                    continue
+                chunk.append((page, crn))
+                if len(chunk) >= PARSE_CHUNK_SIZE:
+                    parse_futures.append(
+                        loop.run_in_executor(executor, parse_eval_pages, chunk, season)
                     )
+                    chunk = []
+            if chunk:
+                parse_futures.append(
+                    loop.run_in_executor(executor, parse_eval_pages, chunk, season)
                 )
 
-            data = []
-            for page, crn in raw_course_evals:
-                parsed = parse_eval_page(page, crn, season)
-                if parsed is None:
-                    continue
-                data.append(parsed)
+            # Pages are keyed by (season, CRN), so sorting by CRN makes the output
+            # independent of the order in which fetches completed
+            data = list(itertools.chain(*await asyncio.gather(*parse_futures)))
             data.sort(key=lambda x: x["crn"])
-            save_cache_json(data_dir / "parsed_evaluations" / f"{season}.json", data)
+            with CacheJsonWriter(
+                data_dir / "parsed_evaluations" / f"{season}.json"
+            ) as writer:
+                for parsed_eval in data:
+                    writer.write(parsed_eval)
 
     await client.aclose()
+    await cas_client.aclose()
     print("\033[F", end="")
     print(f"Fetching course evals for valid seasons: {seasons}... ✔")
+    rate_limiter.print_metrics()
@@ -22,7 +22,10 @@ import httpx
 import ujson
 from tqdm import tqdm
 
-from ferry.crawler.cas_request import CASClient, request, sync_request
+from ferry.crawler.cas_request import CASClient, HostRateLimiter, request
+
+# Attempts for each OCE request; 429s back off the whole host between attempts
+EVAL_FETCH_ATTEMPTS = 5
 
 
 class AuthError(Exception):
@@ -38,6 +41,7 @@ async def is_yale_college(
     season_code: str,
     crn: str,
     client: httpx.AsyncClient,
+    rate_limiter: HostRateLimiter | None = None,
 ) -> bool:
     """
     Helper function to check if course is in Yale College
@@ -62,6 +66,8 @@ async def is_yale_college(
         client=client,
         url="https://courses.yale.edu/api/?page=fose&route=search",
         data=ujson.dumps(all_params),
+        attempts=EVAL_FETCH_ATTEMPTS,
+        rate_limiter=rate_limiter,
     )
 
     if all_response is None:
@@ -99,6 +105,8 @@ async def is_yale_college(
         client=client,
         url="https://courses.yale.edu/api/?page=fose&route=search&col=YC",
         data=ujson.dumps(yc_params),
+        attempts=EVAL_FETCH_ATTEMPTS,
+        rate_limiter=rate_limiter,
     )
 
     if yc_data is None:
@@ -133,6 +141,7 @@ async def fetch_course_evals(
     client: httpx.AsyncClient,
     cas_client: CASClient,
     yale_college_cache: diskcache.Cache,
+    rate_limiter: HostRateLimiter | None = None,
 ) -> tuple[bytes | None, str]:
     course_unique_id = f"{season_code}-{crn}"
 
@@ -148,17 +157,19 @@ async def fetch_course_evals(
         crn=crn,
         client=client,
         yale_college_cache=yale_college_cache,
+        rate_limiter=rate_limiter,
     ):
         # tqdm.write(f"Skipping course {course_unique_id} - not in yale college")
         return None, crn
 
     # tqdm.write(f"Fetching {course_unique_id} ... ", end="")
     try:
-        eval_page = fetch_eval_page(
+        eval_page = await fetch_eval_page(
             client=cas_client,
             crn=crn,
             season_code=season_code,
             data_dir=data_dir,
+            rate_limiter=rate_limiter,
         )  # this is the raw html request, must be processed
         return eval_page, crn
         # tqdm.write("dumped in JSON")
@@ -174,8 +185,12 @@ async def fetch_course_evals(
     return None, crn
 
 
-def fetch_eval_page(
-    client: CASClient, crn: str, season_code: str, data_dir: Path
+async def fetch_eval_page(
+    client: CASClient,
+    crn: str,
+    season_code: str,
+    data_dir: Path,
+    rate_limiter: HostRateLimiter | None = None,
 ) -> bytes:
     """
     Gets evaluation data and comments for the specified course in specified term.
@@ -190,6 +205,8 @@ def fetch_eval_page(
         term code of this course.
     data_dir:
         Path to data directory.
+    rate_limiter:
+        Limiter shared by all concurrent OCE requests.
 
     Returns
     -------
@@ -203,21 +220,36 @@ def fetch_eval_page(
             return ast.literal_eval(file.read())
 
     # OCE website for evaluations
-    url_eval = f"https://oce.app.yale.edu/ocedashboard/studentViewer/courseSummary?{urlencode({'crn': crn, 'termCode': season_code})}"
+    query = urlencode({"crn": crn, "termCode": season_code})
+    url_eval = (
+        f"https://oce.app.yale.edu/ocedashboard/studentViewer/courseSummary?{query}"
+    )
     try:
-        page_index = sync_request(
-            method="POST",
+        response = await request(
+            method="GET",
             url=url_eval,
             client=client,
+            attempts=EVAL_FETCH_ATTEMPTS,
+            rate_limiter=rate_limiter,
         )
     except Exception as err:
         raise FetchError(f"Error fetching evaluations for {season_code}-{crn}: {err}")
 
+    # An expired cookie redirects to the CAS login page
+    if response.is_redirect and "/cas/" in response.headers.get("location", ""):
+        raise AuthError(f"Cookie auth failed for {season_code}-{crn}")
+
+    page_index = response.content
+
     if "Central Authentication Service" in str(page_index):
         raise AuthError(f"Cookie auth failed for {season_code}-{crn}")
 
-    if page_index is None:  # Evaluation data for this term not available
-        raise FetchError(f"Error fetching evaluations for {season_code}-{crn}")
+    # Evaluation data for this term not available
+    if response.status_code != 200 or len(page_index) == 0:
+        raise FetchError(
+            f"Error fetching evaluations for {season_code}-{crn}: "
+            + f"code {response.status_code}"
+        )
 
     # save raw HTML in case we ever need it
     questions_index.mkdir(parents=True, exist_ok=True)
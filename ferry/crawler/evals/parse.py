@@ -12,12 +12,50 @@ class EmptyNarrativeError(Exception):
     pass
 
 
+class EvalPage:
+    """
+    An OCE page parsed once, with the lookups that every question needs.
+
+    Each question's answers live in an `answers{N}` table, where `N` comes from
+    the `questionRow{N}` row whose cell contains the question code. Instead of
+    searching the whole tree for each question, we index the first `td` for
+    each text and the first `table` for each ID in a single walk.
+    """
+
+    def __init__(self, page: bytes):
+        self.soup = BeautifulSoup(page, "lxml")
+        self.td_by_text: dict[str, Tag] = {}
+        self.table_by_id: dict[str, Tag] = {}
+        for tag in cast(ResultSet[Tag], self.soup.find_all(["td", "table"])):
+            if tag.name == "td":
+                text = tag.string
+                if text is not None:
+                    self.td_by_text.setdefault(str(text), tag)
+            else:
+                id = tag.get("id")
+                if type(id) == str:
+                    self.table_by_id.setdefault(id, tag)
+
+    def find_answers_table(self, question_code: str) -> Tag | None:
+        """
+        Find the `answers{N}` table for a question. Raises if the question row
+        can't be located, and returns None if the row exists but the table doesn't.
+        """
+        td = self.td_by_text.get(str(question_code))
+        if td is None or td.parent is None:
+            raise EmptyEvaluationError()
+        id = td.parent.get("id")
+        if type(id) != str:
+            raise EmptyEvaluationError()
+        # Get the 0-indexed question index
+        q_index = id.replace("questionRow", "")
+        return self.table_by_id.get("answers" + q_index)
+
+
 def parse_questions(
-    page: bytes, crn: str, season_code: str
+    page: EvalPage, crn: str, season_code: str
 ) -> tuple[dict[str, str], dict[str, bool]]:
-    soup = BeautifulSoup(page, "lxml")
-
-    questions = soup.find("table", id="questions")
+    questions = page.table_by_id.get("questions")
 
     if questions is None:
         raise EmptyEvaluationError(
@@ -75,21 +113,9 @@ class ParsedEvalRatings(TypedDict):
 
 
 def parse_eval_ratings(
-    page: bytes, questions: dict[str, str], question_code: str
+    page: EvalPage, questions: dict[str, str], question_code: str
 ) -> ParsedEvalRatings:
-    soup = BeautifulSoup(page, "lxml")
-
-    td = soup.find("td", text=str(question_code))
-    if td is None or td.parent is None:
-        raise EmptyEvaluationError()
-    id = td.parent.get("id")
-    if type(id) != str:
-        raise EmptyEvaluationError()
-
-    # Get the 0-indexed question index
-    q_index = id.replace("questionRow", "")
-
-    table = soup.find("table", id="answers" + q_index)
+    table = page.find_answers_table(question_code)
     if table is None:
         raise EmptyEvaluationError()
 
@@ -123,25 +149,13 @@ class ParsedEvalComments(TypedDict):
 
 
 def parse_eval_comments(
-    page: bytes, questions: dict[str, str], question_code: str
+    page: EvalPage, questions: dict[str, str], question_code: str
 ) -> ParsedEvalComments:
-    soup = BeautifulSoup(page, "lxml")
-
     if question_code == "SU124":
         # account for question 10 of summer courses
-        response_table_id = "answers{i}"
+        table = page.table_by_id.get("answers{i}")
     else:
-        td = soup.find("td", text=str(question_code))
-        if td is None or td.parent is None:
-            raise EmptyEvaluationError()
-        id = td.parent.get("id")
-        if type(id) != str:
-            raise EmptyEvaluationError()
-        # Get the 0-indexed question index
-        q_index = id.replace("questionRow", "")
-        response_table_id = "answers" + q_index
-
-    table = soup.find("table", id=response_table_id)
+        table = page.find_answers_table(question_code)
 
     if table is None:
         raise EmptyNarrativeError()
@@ -163,10 +177,8 @@ def parse_eval_comments(
     }
 
 
-def parse_course_header(page: bytes) -> tuple[tuple[int, int], dict[str, Any]]:
-    soup = BeautifulSoup(page, "lxml")
-
-    header = soup.find("div", id="courseHeader")
+def parse_course_header(page: EvalPage) -> tuple[tuple[int, int], dict[str, Any]]:
+    header = page.soup.find("div", id="courseHeader")
     if type(header) != Tag:
         raise EmptyEvaluationError()
     header = header.find("div", class_="row")
@@ -209,13 +221,15 @@ def parse_eval_page(
     if page_index is None:
         return None
     try:
-        (enrolled, responses), extras = parse_course_header(page_index)
+        # Parse the page once and share the tree for all questions
+        page = EvalPage(page_index)
+        (enrolled, responses), extras = parse_course_header(page)
     except:
         # Enrollment data is not available - most likely error page was returned.
         return None
 
     try:
-        questions, question_is_narrative = parse_questions(page_index, crn, season_code)
+        questions, question_is_narrative = parse_questions(page, crn, season_code)
     except EmptyEvaluationError as err:
         questions = {}
         question_is_narrative = {}
@@ -227,13 +241,11 @@ def parse_eval_page(
     for question_code in questions.keys():
         if question_is_narrative[question_code]:
             try:
-                narratives.append(
-                    parse_eval_comments(page_index, questions, question_code)
-                )
+                narratives.append(parse_eval_comments(page, questions, question_code))
             except EmptyNarrativeError:
                 pass
         else:
-            ratings.append(parse_eval_ratings(page_index, questions, question_code))
+            ratings.append(parse_eval_ratings(page, questions, question_code))
 
     return {
         "crn": crn,
@@ -244,3 +256,19 @@ def parse_eval_page(
         "narratives": narratives,
         "extras": extras,
     }
+
+
+def parse_eval_pages(
+    pages: list[tuple[bytes, str]], season_code: str
+) -> list[ParsedEval]:
+    """
+    Parse a chunk of (page, crn) pairs from the same season. Pages are sent to
+    worker processes in chunks so the pickling overhead is amortized.
+    """
+    data: list[ParsedEval] = []
+    for page_index, crn in pages:
+        parsed = parse_eval_page(page_index, crn, season_code)
+        if parsed is None:
+            continue
+        data.append(parsed)
+    return data
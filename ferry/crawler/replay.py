@@ -0,0 +1,187 @@
+"""
+An HTTPX transport that replays recorded Yale responses from the data directory,
+so the crawlers can be run (and benchmarked) without hitting Yale.
+
+Responses are served from the caches the crawlers themselves write:
+
+- `course_seasons.json`: the Yale Course Search homepage (season options)
+- `season_courses/{season}.json` and `{season}_fysem.json`: `route=search`
+- `course_json_cache/{season}.json`: `route=details`
+- `cws_api_cache/{season}.json`: the CourseWebService API
+- `rating_cache/questions_index/{season}_{crn}.html`: OCE course summaries
+
+Latency, server errors and 429s can be injected to emulate a loaded server.
+"""
+
+import ast
+import asyncio
+import random
+import time
+from pathlib import Path
+from typing import Any
+
+import httpx
+import numpy as np
+import ujson
+
+from ferry.crawler.cache import load_cache_json
+
+
+class RequestStats:
+    """
+    Latencies and status codes of all requests served by a transport.
+    """
+
+    def __init__(self):
+        self.latencies: list[float] = []
+        self.status_codes: dict[int, int] = {}
+
+    def record(self, latency: float, status_code: int):
+        self.latencies.append(latency)
+        self.status_codes[status_code] = self.status_codes.get(status_code, 0) + 1
+
+    def summary(self, wall_time: float) -> dict[str, Any]:
+        latencies = np.array(self.latencies) * 1000
+        return {
+            "requests": len(self.latencies),
+            "requests_per_sec": len(self.latencies) / wall_time if wall_time else 0,
+            "p50_ms": float(np.percentile(latencies, 50)) if len(latencies) else 0,
+            "p99_ms": float(np.percentile(latencies, 99)) if len(latencies) else 0,
+            "wall_time_s": wall_time,
+            "status_codes": dict(sorted(self.status_codes.items())),
+        }
+
+
+class ReplayTransport(httpx.AsyncBaseTransport):
+    """
+    Serve recorded responses from `data_dir`.
+
+    Parameters
+    ----------
+    data_dir:
+        Directory containing the crawler caches (usually a ferry-data clone).
+    latency:
+        Base latency of each response, in seconds.
+    jitter:
+        Extra latency drawn uniformly from [0, jitter] seconds.
+    error_rate:
+        Fraction of requests answered with a 500.
+    rate_limit_rate:
+        Fraction of requests answered with a 429 and `Retry-After: 1`.
+    seed:
+        Seed for the injected latency and failures, for reproducible runs.
+    """
+
+    def __init__(
+        self,
+        data_dir: Path,
+        latency: float = 0.0,
+        jitter: float = 0.0,
+        error_rate: float = 0.0,
+        rate_limit_rate: float = 0.0,
+        seed: int = 0,
+    ):
+        self.data_dir = data_dir
+        self.latency = latency
+        self.jitter = jitter
+        self.error_rate = error_rate
+        self.rate_limit_rate = rate_limit_rate
+        self.random = random.Random(seed)
+        self.stats = RequestStats()
+        # Loaded cache files, so repeated requests don't re-read them
+        self.files: dict[Path, Any] = {}
+        # season -> CRN -> course details
+        self.details: dict[str, dict[str, dict[str, Any]]] = {}
+
+    def load(self, path: Path) -> Any:
+        if path not in self.files:
+            self.files[path] = load_cache_json(self.data_dir / path)
+        return self.files[path]
+
+    async def handle_async_request(self, request: httpx.Request) -> httpx.Response:
+        start = time.perf_counter()
+        delay = self.latency + self.random.uniform(0, self.jitter)
+        if delay:
+            await asyncio.sleep(delay)
+        roll = self.random.random()
+        if roll < self.rate_limit_rate:
+            response = httpx.Response(429, headers={"Retry-After": "1"})
+        elif roll < self.rate_limit_rate + self.error_rate:
+            response = httpx.Response(500)
+        else:
+            response = self.route(request)
+        self.stats.record(time.perf_counter() - start, response.status_code)
+        return response
+
+    def route(self, request: httpx.Request) -> httpx.Response:
+        host = request.url.host
+        path = request.url.path
+        if host == "courses.yale.edu" and path == "/":
+            return self.serve_homepage()
+        if host == "courses.yale.edu" and path == "/api/":
+            route = request.url.params.get("route")
+            body = ujson.loads(request.content)
+            if route == "search":
+                return self.serve_search(body)
+            if route == "details":
+                return self.serve_details(body)
+        if host == "gw.its.yale.edu":
+            return self.serve_cws(request.url.params)
+        if host == "oce.app.yale.edu":
+            return self.serve_oce(request.url.params)
+        return httpx.Response(404)
+
+    def serve_homepage(self) -> httpx.Response:
+        seasons = self.load(Path("course_seasons.json")) or []
+        options = "".join(f'<option value="{season}">' for season in seasons)
+        return httpx.Response(200, text=f"<select>{options}</select>")
+
+    def serve_search(self, body: dict[str, Any]) -> httpx.Response:
+        season = body["other"]["srcdb"]
+        criteria = {c["field"]: c["value"] for c in body["criteria"]}
+        suffix = "_fysem" if criteria.get("fsem_attrs") == "Y" else ""
+        courses = self.load(Path("season_courses") / f"{season}{suffix}.json")
+        if courses is None:
+            return httpx.Response(200, json={"fatal": f"Unknown srcdb {season}"})
+        if "crn" in criteria:
+            courses = [x for x in courses if x["crn"] == criteria["crn"]]
+        if "col" in criteria:
+            courses = [x for x in courses if x["col"] == criteria["col"]]
+        return httpx.Response(200, json={"count": len(courses), "results": courses})
+
+    def serve_details(self, body: dict[str, Any]) -> httpx.Response:
+        season = body["srcdb"]
+        if season not in self.details:
+            details = self.load(Path("course_json_cache") / f"{season}.json") or []
+            self.details[season] = {x["crn"]: x for x in details}
+        course = self.details[season].get(body["key"].removeprefix("crn:"))
+        if course is None:
+            return httpx.Response(200, json={"fatal": "Course not found"})
+        return httpx.Response(200, json=course)
+
+    def serve_cws(self, params: httpx.QueryParams) -> httpx.Response:
+        season = params["termCode"]
+        cws_courses = self.load(Path("cws_api_cache") / f"{season}.json") or []
+        season_courses = self.load(Path("season_courses") / f"{season}.json") or []
+        # The recorded responses are merged across schools, so recover the
+        # school of each CRN from the course list
+        crns = {
+            x["crn"]
+            for x in season_courses
+            if x["col"] == params["school"]
+            and x["code"].split(" ")[0] == params["subjectCode"]
+        }
+        return httpx.Response(200, json=[x for x in cws_courses if x["crn"] in crns])
+
+    def serve_oce(self, params: httpx.QueryParams) -> httpx.Response:
+        html_file = (
+            self.data_dir
+            / "rating_cache"
+            / "questions_index"
+            / f"{params['termCode']}_{params['crn']}.html"
+        )
+        if not html_file.is_file():
+            return httpx.Response(404)
+        # Pages are stored as the repr of the raw bytes; see fetch_eval_page
+        with open(html_file) as file:
+            return httpx.Response(200, content=ast.literal_eval(file.read()))
@@ -0,0 +1,166 @@
+"""
+A per-course store of raw API responses, keyed by (season, crn).
+
+Responses are written one at a time as they arrive, so an interrupted crawl
+keeps everything fetched so far, and a single course can be read without
+loading the whole season. Bodies are content-addressed: each one is stored
+zlib-compressed under its SHA-256, and the (season, crn) index points at the
+hash. Re-storing an unchanged response is a no-op, and comparing hashes is a
+cheap way to tell whether a course changed.
+
+The monolithic `{season}.json` files are still produced by `export_season`,
+because that is the layout committed to ferry-data, and they stay the source of
+truth: `sync_season` replaces a season with the contents of its file unless the
+file is exactly what the store last imported or exported. The store can then
+only be ahead of the file by the responses of an interrupted crawl.
+"""
+
+import hashlib
+import sqlite3
+import time
+import zlib
+from collections.abc import Iterable
+from pathlib import Path
+from typing import Any
+
+import ujson
+
+from ferry.crawler.cache import CacheJsonWriter, iter_cache_json
+
+
+def file_hash(path: Path) -> str:
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        while chunk := f.read(1 << 20):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+class ResponseStore:
+    def __init__(self, path: Path):
+        path.parent.mkdir(parents=True, exist_ok=True)
+        self.conn = sqlite3.connect(path)
+        # WAL makes each per-response commit cheap while staying crash-safe
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.execute("PRAGMA synchronous=NORMAL")
+        self.conn.executescript(
+            """
+            CREATE TABLE IF NOT EXISTS blobs (
+                hash TEXT PRIMARY KEY,
+                data BLOB NOT NULL
+            );
+            CREATE TABLE IF NOT EXISTS responses (
+                season TEXT NOT NULL,
+                crn TEXT NOT NULL,
+                hash TEXT NOT NULL,
+                fetched_at REAL NOT NULL,
+                PRIMARY KEY (season, crn)
+            );
+            CREATE TABLE IF NOT EXISTS seasons (
+                season TEXT PRIMARY KEY,
+                source_hash TEXT NOT NULL
+            );
+            """
+        )
+
+    def close(self):
+        self.conn.close()
+
+    def get_hash(self, season: str, crn: str) -> str | None:
+        row = self.conn.execute(
+            "SELECT hash FROM responses WHERE season = ? AND crn = ?", (season, crn)
+        ).fetchone()
+        return row[0] if row else None
+
+    def get(self, season: str, crn: str) -> Any | None:
+        row = self.conn.execute(
+            "SELECT data FROM responses JOIN blobs USING (hash) "
+            + "WHERE season = ? AND crn = ?",
+            (season, crn),
+        ).fetchone()
+        return ujson.loads(zlib.decompress(row[0])) if row else None
+
+    def put(self, season: str, crn: str, data: Any) -> str:
+        """
+        Store a response and return its content hash.
+        """
+        raw = ujson.dumps(data).encode()
+        content_hash = hashlib.sha256(raw).hexdigest()
+        old_hash = self.get_hash(season, crn)
+        with self.conn:
+            self.conn.execute(
+                "INSERT OR IGNORE INTO blobs (hash, data) VALUES (?, ?)",
+                (content_hash, zlib.compress(raw)),
+            )
+            self.conn.execute(
+                "INSERT OR REPLACE INTO responses (season, crn, hash, fetched_at) "
+                + "VALUES (?, ?, ?, ?)",
+                (season, crn, content_hash, time.time()),
+            )
+            if old_hash is not None and old_hash != content_hash:
+                self.conn.execute(
+                    "DELETE FROM blobs WHERE hash = ? AND NOT EXISTS "
+                    + "(SELECT 1 FROM responses WHERE hash = ?)",
+                    (old_hash, old_hash),
+                )
+        return content_hash
+
+    def crns(self, season: str) -> set[str]:
+        return {
+            row[0]
+            for row in self.conn.execute(
+                "SELECT crn FROM responses WHERE season = ?", (season,)
+            )
+        }
+
+    def import_season(self, season: str, responses: Iterable[dict[str, Any]]):
+        """
+        Seed the store from a legacy `{season}.json` list of responses.
+        """
+        for response in responses:
+            self.put(season, response["crn"], response)
+
+    def get_source_hash(self, season: str) -> str | None:
+        row = self.conn.execute(
+            "SELECT source_hash FROM seasons WHERE season = ?", (season,)
+        ).fetchone()
+        return row[0] if row else None
+
+    def set_source_hash(self, season: str, source_hash: str | None):
+        with self.conn:
+            if source_hash is None:
+                self.conn.execute("DELETE FROM seasons WHERE season = ?", (season,))
+            else:
+                self.conn.execute(
+                    "INSERT OR REPLACE INTO seasons (season, source_hash) "
+                    + "VALUES (?, ?)",
+                    (season, source_hash),
+                )
+
+    def sync_season(self, season: str, path: Path):
+        """
+        Make the season match the `{season}.json` at `path` (which may not
+        exist), unless the store already holds what that file was written from.
+        """
+        source_hash = file_hash(path) if path.is_file() else None
+        if self.get_source_hash(season) == source_hash:
+            return
+        with self.conn:
+            self.conn.execute("DELETE FROM responses WHERE season = ?", (season,))
+            self.conn.execute(
+                "DELETE FROM blobs WHERE hash NOT IN (SELECT hash FROM responses)"
+            )
+        if source_hash is not None:
+            self.import_season(season, iter_cache_json(path))
+        self.set_source_hash(season, source_hash)
+
+    def export_season(self, season: str, crns: list[str], path: Path):
+        """
+        Write the responses for `crns`, in order, as a single JSON list, which is
+        the format of the legacy per-season caches. Responses are read from the
+        store one at a time, so the season is never held in memory.
+        """
+        with CacheJsonWriter(path) as writer:
+            for crn in crns:
+                writer.write(self.get(season, crn))
+        self.set_source_hash(season, file_hash(path))
@@ -17,7 +17,7 @@ from openai import RateLimitError
 from tqdm import tqdm
 
 from ferry.ai import DEFAULT_MODEL, LLMClient
-from ferry.crawler.cache import load_cache_json, save_cache_json
+from ferry.crawler.cache import iter_cache_json, load_cache_json, save_cache_json
 
 # Minimum number of comments required to generate a summary
 MIN_COMMENTS_FOR_SUMMARY = 3
@@ -190,16 +190,15 @@ async def summarize_evals(
         existing_summaries: list[CourseSummary] = load_cache_json(output_path) or []
         already_done: set[str] = {str(s["crn"]) for s in existing_summaries}
 
-        # Load parsed evaluations for this season.
-        course_evals: list[dict[str, Any]] | None = load_cache_json(parsed_path)
-        if course_evals is None:
+        if not parsed_path.is_file():
             print(f"No parsed evaluations found for season {season}, skipping.")
             continue
 
-        # Filter to courses that still need summarization.
-        to_process = [
+        # Stream parsed evaluations, keeping only courses that still need
+        # summarization.
+        to_process: list[dict[str, Any]] = [
             c
-            for c in course_evals
+            for c in iter_cache_json(parsed_path)
             if str(c["crn"]) not in already_done and c.get("narratives")
         ]
         if max_courses_per_season is not None:
@@ -9,6 +9,7 @@ import ujson
 from ferry import database
 
 from .cache_id import save_id_cache
+from .columnar_cache import write_parquet
 from .import_courses import import_courses
 from .import_evaluations import import_evaluations
 from .invariants import check_invariants
@@ -22,21 +23,38 @@ from .transform_compute import (
 
 
 def write_csvs(tables: dict[str, pd.DataFrame], data_dir: Path):
-    print("\nWriting tables to disk as CSVs...")
+    """
+    Write each table to `importer_dumps` as CSV, and as Parquet to keep the
+    column types.
+    """
+    print("\nWriting tables to disk as CSVs and Parquet...")
 
     csv_dir = data_dir / "importer_dumps"
     csv_dir.mkdir(parents=True, exist_ok=True)
 
     for table_name, table in tables.items():
         cast(pd.DataFrame, table).to_csv(csv_dir / f"{table_name}.csv", index=False)
+        write_parquet(cast(pd.DataFrame, table), csv_dir / f"{table_name}.parquet")
 
     print("\033[F", end="")
-    print("Writing tables to disk as CSVs... ✔")
+    print("Writing tables to disk as CSVs and Parquet... ✔")
 
 
-async def transform(data_dir: Path) -> dict[str, pd.DataFrame]:
+async def transform(
+    data_dir: Path,
+    cache_dir: Path | None = None,
+    incremental: bool = False,
+    workers: int | None = None,
+    skip_sentiment: bool = False,
+) -> dict[str, pd.DataFrame]:
     """
     Import the parsed course and evaluation data into CSVs generated with Pandas.
+
+    Caches that only speed up later runs are kept in `cache_dir`, if given. With
+    `incremental`, same-course groups of unchanged courses are reused from the
+    previous incremental run, whose snapshot is kept in `cache_dir`. Same-course
+    resolution and sentiment scoring run in `workers` processes (all cores if
+    None). With `skip_sentiment`, comment sentiment scores are all 0.
     """
 
     # get full list of course seasons from files
@@ -56,12 +74,14 @@ async def transform(data_dir: Path) -> dict[str, pd.DataFrame]:
         columns=["season_code", "term", "year"],
     )
 
-    course_tables = import_courses(data_dir, course_seasons)
+    course_tables = import_courses(data_dir, course_seasons, cache_dir=cache_dir)
 
     # Force garbage collection after importing courses (large operation)
     gc.collect()
 
-    eval_tables = import_evaluations(data_dir, course_tables["listings"])
+    eval_tables = import_evaluations(
+        data_dir, course_tables["listings"], cache_dir=cache_dir
+    )
 
     # Force garbage collection after importing evaluations
     gc.collect()
@@ -73,7 +93,10 @@ async def transform(data_dir: Path) -> dict[str, pd.DataFrame]:
     )
 
     eval_tables["evaluation_narratives"] = narratives_computed(
-        eval_tables["evaluation_narratives"]
+        eval_tables["evaluation_narratives"],
+        cache_dir=cache_dir,
+        skip_sentiment=skip_sentiment,
+        workers=workers,
     )
 
     eval_tables["evaluation_statistics"] = evaluation_statistics_computed(
@@ -100,6 +123,9 @@ async def transform(data_dir: Path) -> dict[str, pd.DataFrame]:
         evaluation_statistics=eval_tables["evaluation_statistics"],
         course_professors=course_tables["course_professors"],
         professors=course_tables["professors"],
+        cache_dir=cache_dir,
+        incremental=incremental,
+        workers=workers,
     )
 
     # Force garbage collection after computing courses
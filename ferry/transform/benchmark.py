@@ -0,0 +1,94 @@
+"""
+Benchmark same-course resolution with and without candidate pruning.
+
+Imports the parsed courses in `--data-dir`, runs resolve_historical_courses
+once with every text pair aligned and once with pairs pruned by
+`CandidatePairs`, checks that both produce the same partition, and reports the
+number of aligned pairs and wall time of each run.
+
+    python -m ferry.transform.benchmark --data-dir data -s 202301 202303 202401
+"""
+
+import argparse
+import os
+import time
+from pathlib import Path
+from typing import Any
+
+from ferry.args_parser import DATA_DIR
+from ferry.transform import same_courses
+from ferry.transform.import_courses import import_courses
+
+
+def get_parser():
+    parser = argparse.ArgumentParser(
+        description="Benchmark same-course resolution.",
+        formatter_class=argparse.ArgumentDefaultsHelpFormatter,
+    )
+    parser.add_argument(
+        "--data-dir",
+        help="Directory with the parsed courses (usually a ferry-data clone).",
+        default=DATA_DIR,
+    )
+    parser.add_argument(
+        "-s",
+        "--seasons",
+        nargs="+",
+        help="Seasons to resolve. Defaults to all parsed seasons.",
+    )
+    return parser
+
+
+def main():
+    args = get_parser().parse_args()
+    data_dir = Path(args.data_dir)
+    seasons = args.seasons or sorted(
+        filename.split(".")[0]
+        for filename in os.listdir(data_dir / "parsed_courses")
+        if filename[0] != "."
+    )
+    course_tables = import_courses(data_dir, seasons)
+    course_to_professors = (
+        course_tables["course_professors"]
+        .groupby("course_id")["professor_id"]
+        .apply(frozenset)
+    )
+
+    # Count the pairs that get past the pruning and have to be aligned
+    aligned_pairs = 0
+    distance_in_bounds = same_courses.distance_in_bounds
+
+    def counting_distance_in_bounds(text_1: str, text_2: str, attr: str) -> float:
+        nonlocal aligned_pairs
+        aligned_pairs += 1
+        return distance_in_bounds(text_1, text_2, attr)
+
+    same_courses.distance_in_bounds = counting_distance_in_bounds
+    results: dict[bool, dict[str, Any]] = {}
+    for prune in [False, True]:
+        same_courses.PRUNE_CANDIDATE_PAIRS = prune
+        aligned_pairs = 0
+        start = time.perf_counter()
+        same_course_id, _ = same_courses.resolve_historical_courses(
+            course_tables["courses"], course_tables["listings"], course_to_professors
+        )
+        results[prune] = {
+            "wall_time_s": time.perf_counter() - start,
+            "aligned_pairs": aligned_pairs,
+            "same_course_id": same_course_id,
+        }
+    same_courses.distance_in_bounds = distance_in_bounds
+
+    print(f"{'pruning':<10}{'aligned pairs':>16}{'wall s':>10}")
+    for prune, result in results.items():
+        print(
+            f"{'on' if prune else 'off':<10}{result['aligned_pairs']:>16}"
+            + f"{result['wall_time_s']:>10.2f}"
+        )
+    if not results[False]["same_course_id"].equals(results[True]["same_course_id"]):
+        raise ValueError("Pruning changed the same-course partition")
+    print("Partitions are identical ✔")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,224 @@
+"""
+A columnar cache of the parsed JSON files read by the importers.
+
+Reading every season's JSON with `pd.read_json` dominates the start of each
+transform, even though past seasons rarely change. Each season is cached as a
+Parquet file with the dtypes `pd.read_json` produced, tagged with a hash of the
+source files and the read options. Unchanged seasons are loaded from the cache;
+new or changed ones are read from JSON and cached again.
+
+Hashing still reads every source file, so the cache also records each file's
+size and modification time. While those are unchanged the files are not read
+at all; when they change (e.g. in a fresh clone of ferry-data) the files are
+hashed, and if the contents turn out the same only the recorded times are
+updated.
+
+Object columns (strings, and nested lists and dicts) are stored as Arrow
+types when they convert back to the exact same Python objects. Anything else,
+like mixed scalar types or dicts with varying keys, is stored as JSON text.
+Columns of sets, like the `crns` of the importer tables, are stored as sorted
+lists and read back as frozensets. Values that cannot be stored in either way
+raise a TypeError instead of being silently stringified.
+"""
+
+import hashlib
+import logging
+from pathlib import Path
+from typing import Any
+
+import pandas as pd
+import pyarrow as pa
+import pyarrow.parquet as pq
+import ujson
+
+# Bump whenever the encoding changes, so that old cache files are ignored
+CACHE_VERSION = 1
+
+SOURCE_KEY_METADATA = b"ferry_source_key"
+SOURCE_STATS_METADATA = b"ferry_source_stats"
+OBJECT_COLUMNS_METADATA = b"ferry_object_columns"
+JSON_COLUMNS_METADATA = b"ferry_json_columns"
+SET_COLUMNS_METADATA = b"ferry_set_columns"
+
+
+def source_key(paths: list[Path], read_options: dict[str, Any]) -> bytes:
+    digest = hashlib.blake2b(
+        f"{CACHE_VERSION}\0{read_options!r}".encode(), digest_size=16
+    )
+    for path in paths:
+        digest.update(f"\0{path.name}\0".encode())
+        digest.update(path.read_bytes())
+    return digest.hexdigest().encode()
+
+
+def source_stats_key(paths: list[Path], read_options: dict[str, Any]) -> bytes:
+    digest = hashlib.blake2b(
+        f"{CACHE_VERSION}\0{read_options!r}".encode(), digest_size=16
+    )
+    for path in paths:
+        stat = path.stat()
+        digest.update(
+            f"\0{path.resolve()}\0{stat.st_size}\0{stat.st_mtime_ns}".encode()
+        )
+    return digest.hexdigest().encode()
+
+
+def to_arrow_exactly(values: pd.Series) -> pa.Array | None:
+    """
+    Convert an object column to Arrow if it converts back to the same Python
+    objects, or return None.
+    """
+    try:
+        array = pa.array(values, from_pandas=False)
+        # Compare as JSON, which also tells apart 1 and 1.0, and None and NaN
+        if ujson.dumps(array.to_pylist()) == ujson.dumps(values.tolist()):
+            return array
+    except (pa.ArrowException, TypeError, OverflowError):
+        pass
+    return None
+
+
+def is_set_column(values: pd.Series) -> bool:
+    present = values.dropna()
+    return not present.empty and all(
+        isinstance(value, (set, frozenset)) for value in present
+    )
+
+
+def to_json(column: str, value: Any) -> str:
+    try:
+        return ujson.dumps(value)
+    except (TypeError, OverflowError) as e:
+        raise TypeError(f"Cannot store column {column!r} as Parquet: {e}") from e
+
+
+def write_parquet(
+    frame: pd.DataFrame, path: Path, metadata: dict[bytes, bytes] | None = None
+):
+    object_columns: list[str] = []
+    json_columns: list[str] = []
+    set_columns: list[str] = []
+    arrays: dict[str, pa.Array] = {}
+    for column in frame.columns:
+        values = frame[column]
+        if values.dtype != object:
+            continue
+        if is_set_column(values):
+            set_columns.append(column)
+            values = values.map(sorted, na_action="ignore")
+        array = to_arrow_exactly(values)
+        if array is not None:
+            object_columns.append(column)
+        else:
+            json_columns.append(column)
+            array = pa.array([to_json(column, value) for value in values], pa.string())
+        arrays[column] = array
+    table = pa.Table.from_pandas(frame.drop(columns=list(arrays)), preserve_index=False)
+    for column, array in arrays.items():
+        # A table without columns has no rows to append to
+        table = (
+            table.append_column(column, array)
+            if table.num_columns
+            else pa.table({column: array})
+        )
+    table = table.select([str(column) for column in frame.columns])
+    table = table.replace_schema_metadata(
+        {
+            **(table.schema.metadata or {}),
+            **(metadata or {}),
+            OBJECT_COLUMNS_METADATA: ujson.dumps(object_columns).encode(),
+            JSON_COLUMNS_METADATA: ujson.dumps(json_columns).encode(),
+            SET_COLUMNS_METADATA: ujson.dumps(set_columns).encode(),
+        }
+    )
+    write_table(table, path)
+
+
+def write_table(table: pa.Table, path: Path):
+    path.parent.mkdir(parents=True, exist_ok=True)
+    # Write to a temporary file first so an interrupted run never leaves a
+    # truncated cache file behind
+    temp_path = path.with_suffix(".tmp")
+    pq.write_table(table, temp_path)
+    temp_path.replace(path)
+
+
+def read_parquet(path: Path) -> pd.DataFrame:
+    return table_to_frame(pq.read_table(path))
+
+
+def table_to_frame(table: pa.Table) -> pd.DataFrame:
+    metadata = table.schema.metadata or {}
+    object_columns: list[str] = ujson.loads(
+        metadata.get(OBJECT_COLUMNS_METADATA, b"[]")
+    )
+    json_columns: list[str] = ujson.loads(metadata.get(JSON_COLUMNS_METADATA, b"[]"))
+    table_rest = table.drop_columns(object_columns + json_columns)
+    frame = (
+        table_rest.to_pandas()
+        if table_rest.num_columns
+        else pd.DataFrame(index=pd.RangeIndex(table.num_rows))
+    )
+    for column in object_columns:
+        frame[column] = pd.Series(table.column(column).to_pylist(), dtype=object)
+    for column in json_columns:
+        frame[column] = pd.Series(
+            ujson.loads(f"[{','.join(table.column(column).to_pylist())}]"),
+            dtype=object,
+        )
+    for column in ujson.loads(metadata.get(SET_COLUMNS_METADATA, b"[]")):
+        frame[column] = frame[column].map(frozenset, na_action="ignore")
+    return frame[table.column_names]
+
+
+def read_json(paths: list[Path], read_options: dict[str, Any]) -> pd.DataFrame:
+    frames = [pd.read_json(path, **read_options) for path in paths]
+    return frames[0] if len(frames) == 1 else pd.concat(frames, ignore_index=True)
+
+
+def read_json_cached(
+    paths: list[Path], cache_path: Path | None, **read_options: Any
+) -> pd.DataFrame:
+    """
+    Read and concatenate `paths` with `pd.read_json(path, **read_options)`,
+    reusing `cache_path` if it was written from the same files and options.
+    Without a `cache_path`, the files are always read.
+    """
+    if cache_path is None:
+        return read_json(paths, read_options)
+
+    stats_key = source_stats_key(paths, read_options)
+    key = None
+    if cache_path.is_file():
+        try:
+            metadata = pq.read_schema(cache_path).metadata or {}
+            if metadata.get(SOURCE_STATS_METADATA) == stats_key:
+                return read_parquet(cache_path)
+            key = source_key(paths, read_options)
+            if metadata.get(SOURCE_KEY_METADATA) == key:
+                # Touched but unchanged; record the new stats so that the next
+                # run does not hash the files again
+                table = pq.read_table(cache_path)
+                write_table(
+                    table.replace_schema_metadata(
+                        {**metadata, SOURCE_STATS_METADATA: stats_key}
+                    ),
+                    cache_path,
+                )
+                return table_to_frame(table)
+        except (pa.ArrowException, OSError) as e:
+            logging.warning(f"Ignoring unreadable cache file {cache_path}: {e}")
+
+    frame = read_json(paths, read_options)
+    try:
+        write_parquet(
+            frame,
+            cache_path,
+            {
+                SOURCE_KEY_METADATA: key or source_key(paths, read_options),
+                SOURCE_STATS_METADATA: stats_key,
+            },
+        )
+    except (pa.ArrowException, OSError) as e:
+        logging.warning(f"Failed to cache {cache_path}: {e}")
+    return frame
@@ -0,0 +1,139 @@
+"""
+A persistent memo of `distance_in_bounds` results across runs.
+
+Descriptions and titles of past seasons almost never change, so every run
+would otherwise re-align the same historical text pairs. Entries are keyed by
+a hash of the attribute's distance bound and the normalized pair (stripped,
+shorter text first, as `distance_in_bounds` aligns them), so changing
+MAX_TITLE_DIST or MAX_DESCRIPTION_DIST never returns a stale result.
+
+Entries are looked up in SQLite one key at a time instead of loading the memo
+into memory, which would cost every process a copy of up to `max_entries`
+entries. New and reused keys are kept in memory and written back on `close`.
+Each entry records the last run that used it; when there are more than
+`max_entries`, the least recently used are evicted.
+
+Worker processes open the same file read-only, and send what they looked up
+back to the main process with `take_updates`, to be recorded with
+`apply_updates`.
+"""
+
+import hashlib
+import sqlite3
+from pathlib import Path
+
+MAX_ENTRIES = 1_000_000
+
+# New entries, used keys, hits, and misses since the last `take_updates`
+DistanceCacheUpdates = tuple[dict[bytes, float], set[bytes], int, int]
+
+
+class DistanceCache:
+    def __init__(
+        self, path: Path, max_entries: int = MAX_ENTRIES, read_only: bool = False
+    ):
+        self.path = path
+        self.max_entries = max_entries
+        self.read_only = read_only
+        if read_only:
+            # Only the process that opened the cache for writing creates it
+            self.conn = sqlite3.connect(f"{path.resolve().as_uri()}?mode=ro", uri=True)
+        else:
+            path.parent.mkdir(parents=True, exist_ok=True)
+            self.conn = sqlite3.connect(path)
+            self.conn.execute(
+                """
+                CREATE TABLE IF NOT EXISTS distances (
+                    key BLOB PRIMARY KEY,
+                    distance REAL NOT NULL,
+                    last_used INTEGER NOT NULL
+                )
+                """
+            )
+            self.run = (
+                self.conn.execute("SELECT MAX(last_used) FROM distances").fetchone()[0]
+                or 0
+            ) + 1
+        self.entries = 0
+        self.used: set[bytes] = set()
+        self.new: dict[bytes, float] = {}
+        self.hits = 0
+        self.misses = 0
+
+    @staticmethod
+    def make_key(text_1: str, text_2: str, max_dist: float) -> bytes:
+        text_1 = text_1.strip()
+        text_2 = text_2.strip()
+        if len(text_1) > len(text_2):
+            text_1, text_2 = text_2, text_1
+        return hashlib.blake2b(
+            f"{max_dist!r}\0{text_1}\0{text_2}".encode(), digest_size=16
+        ).digest()
+
+    def get(self, key: bytes) -> float | None:
+        distance = self.new.get(key)
+        if distance is None:
+            row = self.conn.execute(
+                "SELECT distance FROM distances WHERE key = ?", (key,)
+            ).fetchone()
+            distance = row[0] if row else None
+        if distance is None:
+            self.misses += 1
+            return None
+        self.hits += 1
+        self.used.add(key)
+        return distance
+
+    def put(self, key: bytes, distance: float):
+        self.new[key] = distance
+        self.used.add(key)
+
+    def take_updates(self) -> DistanceCacheUpdates:
+        updates = (self.new, self.used, self.hits, self.misses)
+        self.new = {}
+        self.used = set()
+        self.hits = 0
+        self.misses = 0
+        return updates
+
+    def apply_updates(self, updates: DistanceCacheUpdates):
+        new, used, hits, misses = updates
+        self.new.update(new)
+        self.used |= used
+        self.hits += hits
+        self.misses += misses
+
+    def stats(self) -> str:
+        total = self.hits + self.misses
+        hit_rate = self.hits / total if total else 0
+        return (
+            f"Distance cache: {self.hits} hits, {self.misses} misses "
+            + f"({hit_rate:.1%} hit rate), {self.entries} entries"
+        )
+
+    def close(self):
+        if self.read_only:
+            self.conn.close()
+            return
+        with self.conn:
+            self.conn.executemany(
+                "INSERT OR REPLACE INTO distances (key, distance, last_used) "
+                + "VALUES (?, ?, ?)",
+                ((key, distance, self.run) for key, distance in self.new.items()),
+            )
+            self.conn.executemany(
+                "UPDATE distances SET last_used = ? WHERE key = ?",
+                ((self.run, key) for key in self.used - self.new.keys()),
+            )
+            self.entries = self.conn.execute(
+                "SELECT COUNT(*) FROM distances"
+            ).fetchone()[0]
+            excess = self.entries - self.max_entries
+            if excess > 0:
+                self.conn.execute(
+                    "DELETE FROM distances WHERE key IN (SELECT key FROM distances "
+                    + "ORDER BY last_used LIMIT ?)",
+                    (excess,),
+                )
+                self.entries = self.max_entries
+        self.conn.close()
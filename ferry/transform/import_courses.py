@@ -1,16 +1,18 @@
 import logging
-from collections.abc import Callable
+import re
 from pathlib import Path
 from typing import TypedDict
 
 import numpy as np
 import pandas as pd
 import ujson
+from scipy.sparse import coo_matrix
+from scipy.sparse.csgraph import connected_components
 from tqdm import tqdm
 
 from ferry.crawler.cache import load_cache_json
 
-from ..crawler.classes.parse import ParsedMeeting
+from .columnar_cache import read_json_cached
 
 # Mappings from past prof emails to their current ones
 prof_email_changes = {
@@ -58,26 +60,24 @@ distinct_prof_emails: set[frozenset[str]] = {
 
 
 def generate_id(
-    df: pd.DataFrame,
-    get_cache_key: Callable[[pd.Series], str | tuple[str]],
+    cache_keys: pd.Series,
     cache_path: Path,
+    fallback_keys: pd.Series | None = None,
 ) -> pd.Series:
     """
     Generate a unique ID for each row in a DataFrame.
 
-    `column_name` identifies each unique row value. `id_cache` stores existing
-    mappings of `column_name` to ID. Then, for all unmapped rows, they are
-    assigned IDs in increasing values.
+    `cache_keys` identifies each unique row value. `id_cache` stores existing
+    mappings of cache keys to ID. If a row's key is not cached but its entry in
+    `fallback_keys` is, the fallback key is used instead. Then, for all unmapped
+    rows, they are assigned IDs in increasing values.
     """
     id_cache: dict[str, int] = load_cache_json(cache_path) or {}
 
-    def get_applicable_key(row: pd.Series):
-        keys = get_cache_key(row)
-        if isinstance(keys, str):
-            return keys
-        return next((key for key in keys if key in id_cache), keys[0])
-
-    cache_keys = df.apply(get_applicable_key, axis=1)
+    if fallback_keys is not None:
+        cache_keys = cache_keys.where(
+            cache_keys.isin(id_cache) | ~fallback_keys.isin(id_cache), fallback_keys
+        )
     ids = cache_keys.map(id_cache)
     max_flag_id = max(id_cache.values(), default=0)
     unmapped = cache_keys[ids.isna()].unique()
@@ -87,6 +87,21 @@ def generate_id(
     return ids.fillna(cache_keys.map(dict(zip(unmapped, new_flag_ids)))).astype(int)
 
 
+def professor_cache_keys(course_professors: pd.DataFrame) -> pd.Series:
+    """
+    ID cache key of each professor: "name <email>", or just the name if there is
+    no email.
+    """
+    names = course_professors["name"]
+    emails = course_professors["email"]
+    return (names + " <" + emails + ">").where(emails.ne(""), names)
+
+
+def generate_listing_ids(listings: pd.DataFrame) -> pd.Series:
+    season = listings["season_code"].astype(int) - 200000
+    return season * 100000 + listings["crn"]
+
+
 # These classes in their infinite wisdom published two CRNs that are exactly
 # identical and messes up with our assumptions
 exactly_identical_crns = [
@@ -105,12 +120,6 @@ exactly_identical_crns = [
 ]
 
 
-def generate_course_id(row: pd.Series) -> int:
-    season = int(row["season_code"]) - 200000
-    crn = np.min(list(row["crns"]))
-    return season * 100000 + crn
-
-
 def resolve_cross_listings(listings: pd.DataFrame) -> tuple[pd.DataFrame, pd.DataFrame]:
     """
     Resolve course cross-listings using the `crns` from the parsed courses.
@@ -151,74 +160,118 @@ def resolve_cross_listings(listings: pd.DataFrame) -> tuple[pd.DataFrame, pd.Dat
             )
 
     logging.debug("Aggregating cross-listings")
-    # season -> CRN -> set of CRNs it's connected to
-    season_crn_graphs: dict[str, dict[int, frozenset[int]]] = (
-        listings.groupby("season_code")
-        .apply(lambda group: group.set_index("crn")["crns"].to_dict())
-        .to_dict()
-    )
-
-    # Check CRN structure before creating course_id
-    for season in season_crn_graphs:
-        visited: set[int] = set()
-        for crn, crns in season_crn_graphs[season].items():
-            if crn in visited:
-                # A previous row has already verified this CRN
-                continue
-            # Invariant: CRNs contain the CRN itself
-            if crn not in crns:
-                print(
-                    listings[
-                        listings["crn"].eq(crn) & listings["season_code"].eq(season)
-                    ]
-                )
-                raise ValueError("CRN not in CRNs")
-            # Invariant: CRNs form a fully connected component by running DFS
-            stack = [crn]
-            component = []
-            adj_list = season_crn_graphs[season]
-            num_edges = 0
-            while stack:
-                v = stack.pop()
-                if v not in visited:
-                    visited.add(v)
-                    component.append(v)
-                    num_edges += len(adj_list[v])
-                    stack.extend(adj_list[v] - visited)
-            # Since each node also has a self-edge, the number of edges should be n^2
-            if num_edges != len(component) ** 2:
-                print(
-                    listings[
-                        listings["crn"].isin(component)
-                        & listings["season_code"].eq(season)
-                    ]
-                )
-                raise ValueError(
-                    f"CRNs {component} in season {season} not fully connected, counted {num_edges} edges, expected {len(component) ** 2}"
-                )
-
-    listings["course_id"] = listings.apply(generate_course_id, axis=1)
-
-    def validate_course_groups(group: pd.DataFrame):
-        # Each course has identical sections
-        if len(group["section"].unique()) > 1:
-            logging.warning(f"Multiple sections for course {group.name}:\n{group}")
-        # Each course has distinct course codes
-        if len(group["course_code"].unique()) != len(group):
-            logging.warning(f"Identical course codes for course {group.name}:\n{group}")
-
-    listings.groupby("course_id").apply(validate_course_groups)
+    # The CRN graph of each season, as one edge per (CRN, cross-listed CRN).
+    # When a CRN is listed twice, the last listing wins.
+    graph = (
+        listings[["season_code", "crn", "crns"]]
+        .drop_duplicates(subset=["season_code", "crn"], keep="last")
+        .reset_index(drop=True)
+    )
+    nodes = pd.MultiIndex.from_frame(graph[["season_code", "crn"]])
+    edges = graph.explode("crns").astype({"crns": "Int64"})
+    edges["source"] = edges.index
+    edges["target"] = nodes.get_indexer(
+        pd.MultiIndex.from_arrays([edges["season_code"], edges["crns"]])
+    )
 
-    def validate_primary_crn(group: pd.Series):
-        if len(group.unique()) == 1:
-            return group.iloc[0]
-        else:
-            # Add a log here if you want to see how many there are
-            return np.nan
+    # Invariant: cross-listed CRNs are listed in the same season
+    dangling = edges["crns"].notna() & edges["target"].eq(-1)
+    if dangling.any():
+        season, crn = edges.loc[dangling, ["season_code", "crn"]].iloc[0]
+        print(listings[listings["crn"].eq(crn) & listings["season_code"].eq(season)])
+        raise ValueError(f"CRNs of {crn} in season {season} are not all listed")
+
+    # Check CRN structure before creating course_id, one component at a time
+    # in order of their first CRN
+    edges = edges[edges["crns"].isna() | edges["target"].ne(-1)]
+    linked = edges.dropna(subset="crns")
+    _, components = connected_components(
+        coo_matrix(
+            (
+                np.ones(len(linked), dtype=np.int8),
+                (linked["source"].to_numpy(), linked["target"].to_numpy()),
+            ),
+            shape=(len(graph), len(graph)),
+        ),
+        directed=False,
+    )
+    graph["component"] = components
+    edges["component"] = components[edges["source"].to_numpy()]
+    edges["is_self"] = edges["crn"] == edges["crns"]
+    component_stats = edges.groupby("component").agg(
+        first=("source", "min"),
+        num_crns=("source", "nunique"),
+        num_edges=("crns", "count"),
+    )
+    # Invariant: CRNs contain the CRN itself
+    component_stats["has_self"] = (
+        edges.groupby("source")["is_self"]
+        .any()
+        .loc[component_stats["first"]]
+        .to_numpy()
+    )
+    # Invariant: CRNs form a fully connected component. Since each node also has
+    # a self-edge, the number of edges should be n^2
+    component_stats["is_clique"] = (
+        component_stats["num_edges"] == component_stats["num_crns"] ** 2
+    )
+    broken = component_stats[
+        ~component_stats["has_self"] | ~component_stats["is_clique"]
+    ].sort_values("first")
+    if len(broken):
+        first_broken = broken.iloc[0]
+        season, crn = nodes[first_broken["first"]]
+        if not first_broken["has_self"]:
+            print(
+                listings[listings["crn"].eq(crn) & listings["season_code"].eq(season)]
+            )
+            raise ValueError("CRN not in CRNs")
+        component = graph.loc[graph["component"] == broken.index[0], "crn"].tolist()
+        num_edges = first_broken["num_edges"]
+        print(
+            listings[
+                listings["crn"].isin(component) & listings["season_code"].eq(season)
+            ]
+        )
+        raise ValueError(
+            f"CRNs {component} in season {season} not fully connected, counted {num_edges} edges, expected {len(component) ** 2}"
+        )
 
+    # Each course is identified by its season and the smallest of its CRNs
+    min_crns = (
+        listings["crns"]
+        .reset_index(drop=True)
+        .explode()
+        .astype(np.int64)
+        .groupby(level=0)
+        .min()
+    )
+    listings["course_id"] = (
+        listings["season_code"].astype(int).to_numpy() - 200000
+    ) * 100000 + min_crns.to_numpy()
+
+    course_groups = listings.groupby("course_id")
+    # Each course has identical sections
+    multiple_sections = course_groups["section"].nunique(dropna=False) > 1
+    # Each course has distinct course codes
+    identical_codes = (
+        course_groups["course_code"].nunique(dropna=False) != course_groups.size()
+    )
+    invalid_courses = multiple_sections.index[multiple_sections | identical_codes]
+    for course_id, group in listings[
+        listings["course_id"].isin(invalid_courses)
+    ].groupby("course_id"):
+        if multiple_sections[course_id]:
+            logging.warning(f"Multiple sections for course {course_id}:\n{group}")
+        if identical_codes[course_id]:
+            logging.warning(f"Identical course codes for course {course_id}:\n{group}")
+
+    # Courses whose listings disagree on the primary CRN have none. Count the
+    # NaNs here if you want to see how many there are
+    primary_crns = course_groups["primary_crn"]
     listings["primary_crn"] = (
-        listings.groupby("course_id")["primary_crn"]
-        .transform(validate_primary_crn)
+        primary_crns.transform("first")
+        .where(primary_crns.transform("nunique", dropna=False) == 1)
         .astype(pd.Int64Dtype())
     )
     courses = listings.drop_duplicates(subset="course_id").set_index("course_id")
@@ -261,103 +314,119 @@ def aggregate_professors(
     )
     course_professors["email"] = course_professors["email"].replace(prof_email_changes)
 
-    # First: try to fill empty emails
-    def fix_empty_email(group: pd.DataFrame) -> pd.DataFrame:
-        first_valid_email = next((s for s in group["email"] if s), None)
-        if first_valid_email is None:
-            return group
-        group["email"] = group["email"].replace({"": first_valid_email})
+    # First: fill empty emails with the first valid email of the same name
+    emails = course_professors["email"]
+    has_email = emails.fillna("").ne("")
+    first_valid_email = (
+        emails.where(has_email).groupby(course_professors["name"]).transform("first")
+    )
+    course_professors["email"] = emails.mask(
+        emails.eq("") & first_valid_email.notna(), first_valid_email
+    )
+    emails_per_name = course_professors.groupby("name")["email"].nunique(dropna=False)
+    names_with_email = has_email.groupby(course_professors["name"]).any()
+    multiple_emails = emails_per_name.index[
+        (emails_per_name > 1) & names_with_email[emails_per_name.index]
+    ]
+    for name, group in course_professors[
+        course_professors["name"].isin(multiple_emails)
+    ].groupby("name"):
         all_emails = group["email"].unique()
-        if len(all_emails) > 1 and frozenset(all_emails) not in distinct_prof_emails:
-            email_data = [
-                (
-                    email,
-                    pd.merge(group[group["email"] == email], courses, on="course_id")[
-                        ["season_code", "course_code", "section", "title"]
-                    ],
-                )
-                for email in all_emails
-            ]
-            logging.warning(
-                f"Multiple emails with name {group.name}: {all_emails}; they will be treated as separate professors. If they are the same person, add this to `prof_email_changes`. If they are different people, add the following entry to `distinct_prof_emails`: {frozenset(all_emails)}."
+        if frozenset(all_emails) in distinct_prof_emails:
+            continue
+        email_data = [
+            (
+                email,
+                courses.loc[
+                    group.loc[group["email"] == email, "course_id"],
+                    ["season_code", "course_code", "section", "title"],
+                ].reset_index(drop=True),
             )
-            for email, d in email_data:
-                logging.warning(f"Email: {email}\n{d}")
-            if set.intersection(*[set(d["course_code"]) for _, d in email_data]):
-                logging.warning(
-                    "Note: it looks like their course codes overlap, indicating there's a high chance that they are the same person (or the course data itself assigns the wrong professor to some courses)."
-                )
-        return group
-
-    # Second: deduplicate by email, falling back to name
-    course_professors = (
-        course_professors.groupby("name").apply(fix_empty_email).reset_index(drop=True)
-    )
-
-    def fix_different_name(group: pd.DataFrame):
-        rename = prof_name_changes.get(group.name, None)
-        if rename:
-            group["name"] = group["name"].replace(rename)
-        all_names = group["name"].unique()
-        if group.name != "" and len(all_names) > 1:
-            name_data = [
-                (
-                    name,
-                    pd.merge(group[group["name"] == name], courses, on="course_id")[
-                        ["season_code", "course_code", "section", "title"]
-                    ],
-                )
-                for name in all_names
-            ]
-            names_by_season = [
-                name
-                for name, _ in sorted(
-                    name_data, key=lambda x: x[1]["season_code"].max()
-                )
-            ]
-            most_recent_name = names_by_season[-1]
-            group["name"] = most_recent_name
+            for email in all_emails
+        ]
+        logging.warning(
+            f"Multiple emails with name {name}: {all_emails}; they will be treated as separate professors. If they are the same person, add this to `prof_email_changes`. If they are different people, add the following entry to `distinct_prof_emails`: {frozenset(all_emails)}."
+        )
+        for email, d in email_data:
+            logging.warning(f"Email: {email}\n{d}")
+        if set.intersection(*[set(d["course_code"]) for _, d in email_data]):
             logging.warning(
-                f'Multiple names with email {group.name}: {
-                    names_by_season
-                }; they will all be merged as {
-                    most_recent_name
-                } because it seems to be the most recent.\nIf they are the same person, add the following entry to `prof_name_changes`: `"{
-                    group.name
-                }": {{{
-                    ", ".join(
-                        [
-                            f'"{old_name}": "{most_recent_name}"'
-                            for old_name in names_by_season[:-1]
-                        ]
-                    )
-                }}},` (adjust which name you are eventually mapping to depending on what the latest name is).'
+                "Note: it looks like their course codes overlap, indicating there's a high chance that they are the same person (or the course data itself assigns the wrong professor to some courses)."
             )
-            # If you are fixing the warning above, you may find the below useful
-            # for a local run:
-            # for name, d in name_data:
-            #     logging.warning(f"Name: {name}\n{d}")
-            # if not set.intersection(*[set(d["course_code"]) for _, d in name_data]):
-            #     logging.warning(
-            #         f"Note: it looks like their course codes did not overlap, indicating there's a possibility that they are not the same person."
-            #     )
-        return group
 
+    # Second: deduplicate by email, falling back to name
+    # Professors are ordered by email, then by name, which decides the order in
+    # which new professor IDs are assigned
     course_professors = (
-        course_professors.groupby("email")
-        .apply(fix_different_name)
+        course_professors.sort_values("name", kind="stable")
+        .sort_values("email", kind="stable")
+        .dropna(subset="email")
         .reset_index(drop=True)
     )
+    for email, rename in prof_name_changes.items():
+        is_email = course_professors["email"].eq(email)
+        course_professors.loc[is_email, "name"] = course_professors.loc[
+            is_email, "name"
+        ].replace(rename)
+
+    # Each email's names, ordered by the last season they were used, then by
+    # their first appearance
+    names_by_season = (
+        course_professors.assign(
+            season_code=course_professors["course_id"]
+            .map(courses["season_code"])
+            .astype(int),
+            position=course_professors.index,
+        )
+        .groupby(["email", "name"], sort=False)
+        .agg(season_code=("season_code", "max"), position=("position", "min"))
+        .reset_index()
+        .sort_values(["email", "season_code", "position"])
+    )
+    names_per_email = names_by_season.groupby("email")["name"].transform("size")
+    names_by_season = names_by_season[
+        names_by_season["email"].ne("") & names_per_email.gt(1)
+    ]
+    most_recent_names = names_by_season.groupby("email")["name"].last()
+    for email, names in names_by_season.groupby("email")["name"]:
+        names = names.tolist()
+        most_recent_name = most_recent_names[email]
+        logging.warning(
+            f'Multiple names with email {email}: {names}; they will all be merged as {
+                most_recent_name
+            } because it seems to be the most recent.\nIf they are the same person, add the following entry to `prof_name_changes`: `"{
+                email
+            }": {{{
+                ", ".join(
+                    [f'"{old_name}": "{most_recent_name}"' for old_name in names[:-1]]
+                )
+            }}},` (adjust which name you are eventually mapping to depending on what the latest name is).'
+        )
+        # If you are fixing the warning above, you may find the below useful
+        # for a local run:
+        # group = course_professors[course_professors["email"] == email]
+        # name_data = [
+        #     (name, pd.merge(group[group["name"] == name], courses, on="course_id"))
+        #     for name in names
+        # ]
+        # for name, d in name_data:
+        #     logging.warning(f"Name: {name}\n{d}")
+        # if not set.intersection(*[set(d["course_code"]) for _, d in name_data]):
+        #     logging.warning(
+        #         f"Note: it looks like their course codes did not overlap, indicating there's a possibility that they are not the same person."
+        #     )
+
+    has_multiple_names = course_professors["email"].isin(most_recent_names.index)
+    course_professors.loc[has_multiple_names, "name"] = course_professors.loc[
+        has_multiple_names, "email"
+    ].map(most_recent_names)
 
     course_professors["professor_id"] = generate_id(
-        course_professors,
+        professor_cache_keys(course_professors),
+        data_dir / "id_cache" / "professor_id.json",
         # Sometimes a prof's email comes later, so we should "upgrade" the cache
         # key instead of creating a new one if the name-only cache key exists
-        lambda x: (
-            f"{x['name']} <{x['email']}>" if x["email"] else x["name"],
-            x["name"],
-        ),
-        data_dir / "id_cache" / "professor_id.json",
+        fallback_keys=course_professors["name"],
     )
     professors = course_professors.drop_duplicates(
         subset="professor_id", keep="last"
@@ -375,76 +444,96 @@ def aggregate_flags(
     )
 
     course_flags["flag_id"] = generate_id(
-        course_flags,
-        lambda row: row["flag_text"],
-        data_dir / "id_cache" / "flag_id.json",
+        course_flags["flag_text"], data_dir / "id_cache" / "flag_id.json"
     )
     flags = course_flags.drop_duplicates(subset="flag_id").set_index("flag_id")
     return flags, course_flags
 
 
-def parse_location(location: str) -> dict[str, str | None]:
-    def do_parse():
-        if " - " not in location:
-            if " " not in location:
-                # Just building code
-                return {"building_name": None, "code": location, "room": None}
-            # [code] [room]
-            code, room = location.split(" ", 1)
-            return {"building_name": None, "code": code, "room": room}
-        abbrev, rest = location.split(" - ", 1)
-        if " " not in abbrev:
-            if rest == abbrev:
-                rest = None
-            # [code] - [building name]
-            return {"building_name": rest, "code": abbrev, "room": None}
-        code, room = abbrev.split(" ", 1)
-        if not rest.endswith(room):
-            raise ValueError(f"Unexpected location format: {location}")
-        building_full_name = rest.removesuffix(f" {room}")
-        if building_full_name == code:
-            building_full_name = None
-        # [code] [room] - [building name] [room]
-        return {"building_name": building_full_name, "code": code, "room": room}
-
-    res = do_parse()
-    for key in res:
-        if res[key] == "" or res[key] == "TBA":
-            res[key] = None
-    if res["code"] is None:
-        raise ValueError(f"Unexpected location format: {location}")
-    return res
+def parse_locations(locations: pd.Series) -> pd.DataFrame:
+    """
+    Parse each location into its building name, building code, and room. The
+    recognized formats are:
+
+    - [code]
+    - [code] [room]
+    - [code] - [building name]
+    - [code] [room] - [building name] [room]
+
+    Empty and TBA parts are None. Locations in any other format have no code.
+    """
+    parts = locations.str.extract(
+        r"^(?P<abbrev>.*?)(?: - (?P<rest>.*))?\Z", flags=re.DOTALL
+    )
+    parts = parts.join(
+        parts["abbrev"].str.extract(
+            r"^(?P<code>[^ ]*)(?: (?P<room>.*))?\Z", flags=re.DOTALL
+        )
+    )
+    # [code] - [building name]
+    building_name = parts["rest"].where(parts["rest"] != parts["abbrev"])
+    # [code] [room] - [building name] [room]: the name is the rest without the
+    # trailing room, found by matching the room against the end of the rest
+    room_suffix = (parts["room"] + "\x1f" + parts["rest"]).str.extract(
+        r"^(?P<room>.*)\x1f(?P<prefix>.*)(?P=room)\Z", flags=re.DOTALL
+    )["prefix"]
+    building_full_name = parts["rest"].mask(
+        room_suffix.str.endswith(" ", na=False), room_suffix.str[:-1]
+    )
+    has_room_and_name = parts["room"].notna() & parts["rest"].notna()
+    building_name = building_name.mask(
+        has_room_and_name,
+        building_full_name.where(building_full_name != parts["code"]),
+    )
+
+    parsed = (
+        pd.DataFrame(
+            {
+                "building_name": building_name,
+                "code": parts["code"],
+                "room": parts["room"],
+            }
+        )
+        .replace({"": None, "TBA": None})
+        .astype(object)
+    )
+    parsed = parsed.where(parsed.notna(), None)
+    invalid = parsed["code"].isna() | (has_room_and_name & room_suffix.isna())
+    parsed.loc[invalid, :] = None
+    return parsed
 
 
 def aggregate_locations(
     courses: pd.DataFrame, data_dir: Path
 ) -> tuple[pd.DataFrame, pd.DataFrame, pd.DataFrame]:
-    location_data = []
-    for meetings in courses["meetings"]:
-        for meeting in meetings:
-            if meeting["location"] in ["", "TBA", "TBA TBA"]:
-                continue
-            try:
-                parsed_location = parse_location(meeting["location"])
-                # Only add location if it has a valid building code
-                if (
-                    parsed_location["code"] is not None
-                    and str(parsed_location["code"]).strip() != ""
-                ):
-                    location_data.append(
-                        {**parsed_location, "url": meeting["location_url"]}
-                    )
-            except ValueError as e:
-                logging.warning(
-                    f"Failed to parse location '{meeting['location']}': {e}"
-                )
-                continue
+    # Every meeting as a row, indexed by course ID
+    meetings = courses["meetings"].explode().dropna()
+    meetings = pd.DataFrame(
+        meetings.tolist(),
+        index=meetings.index,
+        columns=["days_of_week", "start_time", "end_time", "location", "location_url"],
+    )
 
-    locations = pd.DataFrame(location_data).drop_duplicates().reset_index(drop=True)
+    # Parse each distinct location once, for both locations and course_meetings
+    has_location = ~meetings["location"].isin(["", "TBA", "TBA TBA"])
+    distinct_locations = meetings.loc[has_location, "location"].drop_duplicates()
+    parsed_locations = parse_locations(distinct_locations.set_axis(distinct_locations))
+    for location in parsed_locations.index[parsed_locations["code"].isna()]:
+        logging.warning(
+            f"Failed to parse location '{location}': Unexpected location format: {location}"
+        )
+    meeting_locations = parsed_locations.reindex(meetings["location"]).set_axis(
+        meetings.index
+    )
 
-    # Filter out any rows where code is still None or NaN
-    locations = locations.dropna(subset=["code"])
-    locations = locations[locations["code"].notna() & (locations["code"] != "")]
+    # Only add locations with a valid building code
+    has_code = has_location & meeting_locations["code"].notna()
+    locations = (
+        meeting_locations[has_code]
+        .assign(url=meetings.loc[has_code, "location_url"])
+        .drop_duplicates()
+        .reset_index(drop=True)
+    )
 
     def report_multiple_names(row: pd.DataFrame):
         if len(row["building_name"].unique()) > 1:
@@ -489,50 +578,33 @@ def aggregate_locations(
 
     # For each meeting, coalesce location and location_url into a location_id
     # (which is None if location is TBA)
-    def transform_course_meetings(original_meetings: list[ParsedMeeting]):
-        if len(original_meetings) == 0:
-            return []
-        meetings = []
-        for m in original_meetings:
-            if m["location"] in ["", "TBA", "TBA TBA"]:
-                meetings.append(
-                    {
-                        "days_of_week": m["days_of_week"],
-                        "start_time": m["start_time"],
-                        "end_time": m["end_time"],
-                        "location_id": None,
-                        "_building_code": None,
-                        "_room": None,
-                    }
-                )
-                continue
-            location_info = parse_location(m["location"])
-            meetings.append(
-                {
-                    "days_of_week": m["days_of_week"],
-                    "start_time": m["start_time"],
-                    "end_time": m["end_time"],
-                    "location_id": None,
-                    "_building_code": location_info["code"],
-                    "_room": location_info["room"],
-                }
-            )
-        return meetings
-
-    course_meetings = courses["meetings"].apply(transform_course_meetings)
-    # course_meetings is a series of course_id -> list of dicts.
-    # Explode it to get a DataFrame with course_id, days_of_week, start_time, end_time, location_id
-    course_meetings = course_meetings.explode().dropna().apply(pd.Series).reset_index()
-
     course_meetings = (
-        course_meetings.groupby(
-            ["course_id", "start_time", "end_time", "_building_code", "_room"],
-            dropna=False,
+        meetings[["days_of_week", "start_time", "end_time"]]
+        .assign(
+            location_id=None,
+            _building_code=meeting_locations["code"],
+            _room=meeting_locations["room"],
         )
-        # location_id is always None anyway
-        .agg({"days_of_week": reduce_days_of_week, "location_id": "first"})
         .reset_index()
     )
+
+    meeting_groups = course_meetings.groupby(
+        ["course_id", "start_time", "end_time", "_building_code", "_room"],
+        dropna=False,
+    )
+    # Meetings at the same time and place on different days are merged by
+    # OR-ing their days_of_week bitmasks
+    days_of_week = np.zeros(meeting_groups.ngroups, dtype=np.int64)
+    np.bitwise_or.at(
+        days_of_week,
+        meeting_groups.ngroup().to_numpy(),
+        course_meetings["days_of_week"].to_numpy(dtype=np.int64),
+    )
+    # location_id is always None anyway
+    course_meetings = meeting_groups.agg({"location_id": "first"}).reset_index()
+    course_meetings.insert(
+        course_meetings.columns.get_loc("location_id"), "days_of_week", days_of_week
+    )
     course_meetings["days_of_week"] = course_meetings["days_of_week"].astype(int)
     course_meetings["location_id"] = course_meetings["location_id"].astype(
         pd.Int64Dtype()
@@ -541,13 +613,6 @@ def aggregate_locations(
     return course_meetings, locations, buildings
 
 
-def reduce_days_of_week(days_of_week: list[int]) -> int:
-    res = 0
-    for i in days_of_week:
-        res |= i
-    return res
-
-
 class CourseTables(TypedDict):
     courses: pd.DataFrame
     listings: pd.DataFrame
@@ -560,15 +625,13 @@ class CourseTables(TypedDict):
     buildings: pd.DataFrame
 
 
-def generate_listing_id(row: pd.Series) -> int:
-    season = int(row["season_code"]) - 200000
-    return season * 100000 + row["crn"]
-
-
-def import_courses(data_dir: Path, seasons: list[str]) -> CourseTables:
+def import_courses(
+    data_dir: Path, seasons: list[str], cache_dir: Path | None = None
+) -> CourseTables:
     """
     Import courses from JSON files in `parsed_courses_dir`.
     Splits the raw data into various tables for the database.
+    Parsed seasons are cached in `cache_dir`, if given.
 
     Returns
     -------
@@ -590,8 +653,13 @@ def import_courses(data_dir: Path, seasons: list[str]) -> CourseTables:
         if not parsed_courses_file.is_file():
             print(f"Skipping season {season}: not found in parsed courses.")
             continue
-        parsed_course_info = pd.read_json(
-            parsed_courses_file,
+        parsed_course_info = read_json_cached(
+            [parsed_courses_file],
+            (
+                cache_dir / "transform_cache" / "parsed_courses" / f"{season}.parquet"
+                if cache_dir
+                else None
+            ),
             dtype={
                 "crn": int,
                 "primary_crn": pd.Int64Dtype(),
@@ -631,7 +699,7 @@ def import_courses(data_dir: Path, seasons: list[str]) -> CourseTables:
     gc.collect()
 
     listings["section"] = listings["section"].fillna("0").astype(str).replace({"": "0"})
-    listings["listing_id"] = listings.apply(generate_listing_id, axis=1)
+    listings["listing_id"] = generate_listing_ids(listings)
 
     listings, courses = resolve_cross_listings(listings)
     import gc
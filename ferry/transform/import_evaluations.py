@@ -1,3 +1,4 @@
+import itertools
 import logging
 import re
 from pathlib import Path
@@ -11,6 +12,8 @@ from tqdm import tqdm
 from ferry import database
 from ferry.crawler.cache import load_cache_json
 
+from .columnar_cache import read_json_cached
+
 
 def match_evaluations_to_courses(
     evals: pd.DataFrame, listings: pd.DataFrame
@@ -114,10 +117,13 @@ class EvalTables(TypedDict):
     evaluation_questions: pd.DataFrame
 
 
-def import_evaluations(data_dir: Path, listings: pd.DataFrame) -> EvalTables:
+def import_evaluations(
+    data_dir: Path, listings: pd.DataFrame, cache_dir: Path | None = None
+) -> EvalTables:
     """
     Import evaluations from JSON files in `data_dir`.
     Splits the raw data into various tables for the database.
+    Parsed seasons are cached in `cache_dir`, if given.
 
     Returns
     -------
@@ -129,11 +135,29 @@ def import_evaluations(data_dir: Path, listings: pd.DataFrame) -> EvalTables:
     print("\nImporting course evaluations...")
     parsed_evals_dir = data_dir / "parsed_evaluations"
     eval_filenames = sorted([x.name for x in parsed_evals_dir.glob("*.json")])
+    # crawl_evals writes one {season}.json per season. Older per-course
+    # {season}-{crn}.json files are grouped with their season, which is cached
+    # together
+    season_filenames = [
+        (season, list(filenames))
+        for season, filenames in itertools.groupby(
+            eval_filenames, key=lambda filename: Path(filename).stem.split("-")[0]
+        )
+    ]
     all_imported_evals: list[pd.DataFrame] = []
-    for filename in tqdm(eval_filenames, desc="Loading eval JSONs", leave=False):
-        parsed_evals_file = parsed_evals_dir / filename
-        parsed_course_info = pd.read_json(
-            parsed_evals_file,
+    for season, filenames in tqdm(
+        season_filenames, desc="Loading eval JSONs", leave=False
+    ):
+        parsed_course_info = read_json_cached(
+            [parsed_evals_dir / filename for filename in filenames],
+            (
+                cache_dir
+                / "transform_cache"
+                / "parsed_evaluations"
+                / f"{season}.parquet"
+                if cache_dir
+                else None
+            ),
             dtype={
                 "crn": int,
                 "season": str,
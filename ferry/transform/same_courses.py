@@ -2,14 +2,24 @@
 Find historical offerings of a course.
 """
 
+import concurrent.futures
+import hashlib
 import itertools
+import os
+from pathlib import Path
 from typing import cast
 
 import edlib
+import numpy as np
 import pandas as pd
-from scipy.cluster.hierarchy import DisjointSet
+from scipy.sparse import coo_matrix
+from scipy.sparse.csgraph import connected_components
 from tqdm import tqdm
 
+from ferry.crawler.cache import load_cache_json, save_cache_json
+from ferry.transform.distance_cache import DistanceCache, DistanceCacheUpdates
+from ferry.transform.union_find import UnionFind
+
 # TODO: I don't quite like these hard-coded constants. Is there a better way
 # to measure similarity that's more context-aware?
 MIN_TITLE_MATCH_LEN = 8
@@ -18,6 +28,19 @@ MIN_DESCRIPTION_MATCH_LEN = 32
 MAX_TITLE_DIST = 0.25
 MAX_DESCRIPTION_DIST = 0.25
 
+# Before aligning two texts, compare their counts of character bigrams (hashed
+# into this many buckets) to skip pairs that cannot be within the distance
+# bounds. Only done for groups with at least MIN_PRUNE_GROUP_SIZE distinct
+# texts, where it pays for itself.
+PRUNE_CANDIDATE_PAIRS = True
+BIGRAM_BUCKETS = 256
+MIN_PRUNE_GROUP_SIZE = 8
+
+# Incremental runs reuse the groups of unchanged components from the previous
+# snapshot. Bump this whenever a change to the merging logic can change the
+# resulting groups, so that stale snapshots are ignored.
+PARTITION_VERSION = 1
+
 subject_changes = {
     "G&G": "EPS",
     "STAT": "S&DS",
@@ -160,6 +183,14 @@ def fix_department(code: str) -> str:
     return code
 
 
+def max_distance(attr: str) -> float:
+    if attr == "title_norm":
+        return MAX_TITLE_DIST
+    if attr == "description":
+        return MAX_DESCRIPTION_DIST
+    raise ValueError(f"Unknown attribute: {attr}")
+
+
 def distance_in_bounds(text_1: str, text_2: str, attr: str) -> float:
     """
     Get edit distance between two texts.
@@ -172,12 +203,7 @@ def distance_in_bounds(text_1: str, text_2: str, attr: str) -> float:
     if text_1 == "" or text_2 == "":
         return -1
 
-    if attr == "title_norm":
-        max_dist = MAX_TITLE_DIST
-    elif attr == "description":
-        max_dist = MAX_DESCRIPTION_DIST
-    else:
-        raise ValueError(f"Unknown attribute: {attr}")
+    max_dist = max_distance(attr)
 
     # Make sure the shorter text comes first for infix (HW) edit distance
     if len(text_1) > len(text_2):
@@ -197,6 +223,186 @@ def distance_in_bounds(text_1: str, text_2: str, attr: str) -> float:
     return raw_dist / len(text_1)
 
 
+def cached_distance_in_bounds(
+    text_1: str, text_2: str, attr: str, distance_cache: DistanceCache | None
+) -> float:
+    if distance_cache is None:
+        return distance_in_bounds(text_1, text_2, attr)
+    key = DistanceCache.make_key(text_1, text_2, max_distance(attr))
+    distance = distance_cache.get(key)
+    if distance is None:
+        distance = distance_in_bounds(text_1, text_2, attr)
+        distance_cache.put(key, distance)
+    return distance
+
+
+class CandidatePairs:
+    """
+    Cheap necessary condition for `distance_in_bounds(texts[i], texts[j], attr)`
+    to be in bounds, so most pairs never need an alignment.
+
+    Every edit touches at most two character bigrams of the shorter text (the
+    query), and all other bigrams of the query also appear in the text it is
+    aligned to. So if more than 2 * max_dist * len(query) of the query's
+    bigrams are missing from the other text, the pair is out of bounds. This
+    holds for infix alignment, unlike length-based filters (a short title can
+    be within bounds of any longer one containing it). Bigrams are hashed into
+    buckets, which can only hide missing bigrams, never add any.
+
+    Rows are computed one at a time, for all pairs (i, j > i).
+    """
+
+    def __init__(self, texts: list[str], attr: str):
+        texts = [text.strip() for text in texts]
+        self.max_dist = max_distance(attr)
+        self.lengths = np.array([len(text) for text in texts])
+        self.counts = np.zeros((len(texts), BIGRAM_BUCKETS), dtype=np.int32)
+        for i, text in enumerate(texts):
+            codes = np.frombuffer(text.encode("utf-32-le"), dtype=np.uint32)
+            bigrams = (codes[:-1].astype(np.int64) * 1009 + codes[1:]) % BIGRAM_BUCKETS
+            self.counts[i] = np.bincount(bigrams, minlength=BIGRAM_BUCKETS)
+        self.row = -1
+        self.row_candidates = np.zeros(0, dtype=bool)
+
+    def compute_row(self, i: int):
+        counts = self.counts[i + 1 :]
+        lengths = self.lengths[i + 1 :]
+        # Like distance_in_bounds, text i is the query unless it is longer
+        missing_from_others = np.maximum(self.counts[i] - counts, 0).sum(axis=1)
+        missing_from_i = np.maximum(counts - self.counts[i], 0).sum(axis=1)
+        query_is_i = self.lengths[i] <= lengths
+        missing = np.where(query_is_i, missing_from_others, missing_from_i)
+        query_lengths = np.minimum(self.lengths[i], lengths)
+        self.row = i
+        self.row_candidates = (query_lengths > 0) & (
+            missing <= 2 * self.max_dist * query_lengths
+        )
+
+    def __contains__(self, pair: tuple[int, int]) -> bool:
+        i, j = pair
+        if self.row != i:
+            self.compute_row(i)
+        return bool(self.row_candidates[j - i - 1])
+
+
+def rules_fingerprint() -> str:
+    """
+    Hash of every constant that affects the partition. A snapshot made under
+    different rules is never reused.
+    """
+    rules = (
+        PARTITION_VERSION,
+        MAX_TITLE_DIST,
+        MAX_DESCRIPTION_DIST,
+        sorted(subject_changes.items()),
+        sorted(code_changes.items()),
+        do_not_merge_on_prof,
+        sorted(do_not_merge_on_similar_text),
+        [[sorted(map(repr, group)) for group in spec] for spec in always_distinct],
+    )
+    return hashlib.sha256(repr(rules).encode()).hexdigest()
+
+
+def find_dependent_components(data: pd.DataFrame, listings: pd.DataFrame) -> pd.Series:
+    """
+    Label each course with the component of courses that its same-course
+    assignment depends on.
+
+    The title pass only makes unconditional merges between courses sharing a
+    title and either a department, a professor, or cross-listed codes. The code
+    pass only compares courses sharing a code (counting `code_changes`). So two
+    courses can only interact if they are linked by a chain of shared codes,
+    title + department pairs, or title + professor pairs, and partitioning each
+    such component on its own gives the same groups as partitioning everything.
+    """
+    new_to_old_code = {new: old for old, new in code_changes.items()}
+    renamed = listings[listings["course_code"].isin(new_to_old_code)]
+    departments = data["course_codes"].explode().str.split(" ", n=1).str[0]
+    has_generic_title = data["title_norm"].apply(
+        lambda title: any(keyword in title for keyword in do_not_merge_on_prof)
+    )
+    professors = data.loc[~has_generic_title, "prof_ids"].explode().dropna()
+    course_keys = pd.concat(
+        [
+            pd.DataFrame(
+                {
+                    "course_id": listings["course_id"].values,
+                    "key": "code " + listings["course_code_norm"].values,
+                }
+            ),
+            pd.DataFrame(
+                {
+                    "course_id": renamed["course_id"].values,
+                    "key": "code " + renamed["course_code"].map(new_to_old_code).values,
+                }
+            ),
+            pd.DataFrame(
+                {
+                    "course_id": departments.index,
+                    "key": "department "
+                    + data.loc[departments.index, "title_norm"].values
+                    + "\0"
+                    + departments.values,
+                }
+            ),
+            pd.DataFrame(
+                {
+                    "course_id": professors.index,
+                    "key": "professor "
+                    + data.loc[professors.index, "title_norm"].values
+                    + "\0"
+                    + professors.astype(str).values,
+                }
+            ),
+        ]
+    )
+    # Components of the bipartite graph between courses and their keys
+    course_nodes = data.index.get_indexer(course_keys["course_id"])
+    key_nodes, keys = pd.factorize(course_keys["key"])
+    in_data = course_nodes >= 0
+    num_nodes = len(data) + len(keys)
+    graph = coo_matrix(
+        (
+            np.ones(in_data.sum(), dtype=np.int8),
+            (course_nodes[in_data], len(data) + key_nodes[in_data]),
+        ),
+        shape=(num_nodes, num_nodes),
+    )
+    _, labels = connected_components(graph, directed=False)
+    return pd.Series(labels[: len(data)], index=data.index)
+
+
+def component_fingerprints(
+    data: pd.DataFrame, listings: pd.DataFrame, components: pd.Series
+) -> pd.Series:
+    """
+    Hash everything the partitioning reads about the courses of each component.
+    """
+    raw_codes = listings.groupby("course_id")["course_code"].apply(sorted)
+    course_fingerprints = pd.Series(
+        [
+            repr(
+                (
+                    row.Index,
+                    row.season_code,
+                    row.title_norm,
+                    row.description,
+                    sorted(row.course_codes),
+                    sorted(row.prof_ids) if isinstance(row.prof_ids, frozenset) else [],
+                    raw_codes.get(row.Index, []),
+                )
+            )
+            for row in data.itertuples()
+        ],
+        index=data.index,
+    )
+    return (
+        course_fingerprints.sort_index()
+        .groupby(components)
+        .agg(lambda rows: hashlib.sha256("\n".join(rows).encode()).hexdigest())
+    )
+
+
 def reverse_map(mapping: pd.Series) -> pd.Series:
     return (
         mapping.explode()
@@ -207,7 +413,12 @@ def reverse_map(mapping: pd.Series) -> pd.Series:
 
 
 def resolve_historical_courses(
-    courses: pd.DataFrame, listings: pd.DataFrame, course_to_professors: pd.Series
+    courses: pd.DataFrame,
+    listings: pd.DataFrame,
+    course_to_professors: pd.Series,
+    distance_cache_path: Path | None = None,
+    snapshot_path: Path | None = None,
+    workers: int | None = 1,
 ) -> tuple[pd.Series, dict[int, list[int]]]:
     """
     Among courses, identify historical offerings of a course.
@@ -215,6 +426,18 @@ def resolve_historical_courses(
     This is equivalent to constructing a partition of course_ids such that each
     partition contains the same courses, offered over different terms.
 
+    If `distance_cache_path` is given, text distances are memoized there across
+    runs, so only pairs involving new or changed texts are aligned again.
+
+    If `snapshot_path` is given, components of courses that are unchanged since
+    the snapshot there reuse their previous groups, only the rest are
+    partitioned again, and the groups of every independent component are saved
+    back to it. Any change to the matching rules makes the
+    whole snapshot stale.
+
+    Independent components are partitioned in a pool of `workers` processes
+    (all cores if None).
+
     Returns
     -------
     same_course_id:
@@ -242,10 +465,43 @@ def resolve_historical_courses(
     summer_listings = listings[listings["season_code"].str.endswith("2")]
     school_data = data[~data["season_code"].str.endswith("2")]
     summer_data = data[data["season_code"].str.endswith("2")]
-    tqdm.pandas(desc="Partitioning school year courses", leave=False)
-    school_same_course_id = partition_same_courses(school_data, school_listings)
-    tqdm.pandas(desc="Partitioning summer courses", leave=False)
-    summer_same_course_id = partition_same_courses(summer_data, summer_listings)
+    distance_cache = DistanceCache(distance_cache_path) if distance_cache_path else None
+    if snapshot_path:
+        rules = rules_fingerprint()
+        previous_components: dict[str, list[list[int]]] = {}
+        snapshot = load_cache_json(snapshot_path)
+        if snapshot and snapshot["rules"] == rules:
+            previous_components = snapshot["components"]
+        elif snapshot:
+            print("Same-course rules changed, rebuilding all groups")
+        tqdm.pandas(desc="Partitioning school year courses", leave=False)
+        school_same_course_id, school_components = partition_same_courses_incremental(
+            school_data, school_listings, previous_components, distance_cache, workers
+        )
+        tqdm.pandas(desc="Partitioning summer courses", leave=False)
+        summer_same_course_id, summer_components = partition_same_courses_incremental(
+            summer_data, summer_listings, previous_components, distance_cache, workers
+        )
+        save_cache_json(
+            snapshot_path,
+            {
+                "rules": rules,
+                "components": {**school_components, **summer_components},
+            },
+            indent=0,
+        )
+    else:
+        tqdm.pandas(desc="Partitioning school year courses", leave=False)
+        school_same_course_id = partition_same_courses_parallel(
+            school_data, school_listings, distance_cache, workers
+        )
+        tqdm.pandas(desc="Partitioning summer courses", leave=False)
+        summer_same_course_id = partition_same_courses_parallel(
+            summer_data, summer_listings, distance_cache, workers
+        )
+    if distance_cache:
+        distance_cache.close()
+        print(distance_cache.stats())
     discussion_same_course_id = pd.Series(
         discussion_ids.values, index=discussion_ids.values
     )
@@ -261,44 +517,177 @@ def resolve_historical_courses(
     return same_course_id, same_course_to_courses
 
 
-def partition_same_courses(data: pd.DataFrame, listings: pd.DataFrame) -> pd.Series:
+def partition_same_courses(
+    data: pd.DataFrame,
+    listings: pd.DataFrame,
+    distance_cache: DistanceCache | None = None,
+    progress: bool = True,
+) -> pd.Series:
     data = data[data.index.isin(listings["course_id"])]
-    same_course_partitions = DisjointSet(elements=data.index)
-    have_cross_listed = DisjointSet(elements=listings["course_code_norm"])
+    # Track the seasons of each partition, because courses from the same season
+    # are never merged by similar text
+    same_course_partitions = UnionFind(data.index, labels=data["season_code"])
+    have_cross_listed = UnionFind(listings["course_code_norm"])
 
     def mark_cross_listed(codes: list[str]):
         for c1, c2 in itertools.pairwise(codes):
             have_cross_listed.merge(c1, c2)
 
     data["course_codes"].apply(mark_cross_listed)
-    tqdm.pandas(desc="Merging same title courses", leave=False)
+    tqdm.pandas(desc="Merging same title courses", leave=False, disable=not progress)
     data.groupby("title_norm").progress_apply(
         merge_same_title_courses,
         include_groups=False,
         same_course_partitions=same_course_partitions,
         have_cross_listed=have_cross_listed,
     )
-    tqdm.pandas(desc="Merging same code courses", leave=False)
+    tqdm.pandas(desc="Merging same code courses", leave=False, disable=not progress)
     listings.groupby("course_code_norm")["course_id"].progress_apply(
         merge_same_code_courses,
         include_groups=False,
         listings=listings,
         data=data,
         same_course_partitions=same_course_partitions,
+        distance_cache=distance_cache,
     )
     return map_course_id_to_same_course_id(same_course_partitions, data)
 
 
-def all_same_course(group: pd.DataFrame, same_course_partitions: DisjointSet):
-    return same_course_partitions.subset(group.index[0]) >= set(group.index)
+# Each worker process of partition_same_courses_parallel opens the distance
+# cache read-only; new entries are sent back to the main process
+worker_distance_cache: DistanceCache | None = None
+
+
+def init_partition_worker(distance_cache_path: Path | None):
+    global worker_distance_cache
+    if distance_cache_path:
+        worker_distance_cache = DistanceCache(distance_cache_path, read_only=True)
+
+
+def partition_shard(
+    data: pd.DataFrame, listings: pd.DataFrame
+) -> tuple[pd.Series, DistanceCacheUpdates | None]:
+    same_course_id = partition_same_courses(
+        data, listings, worker_distance_cache, progress=False
+    )
+    updates = worker_distance_cache.take_updates() if worker_distance_cache else None
+    return same_course_id, updates
+
+
+def plan_shards(components: pd.Series, num_shards: int) -> list[pd.Index]:
+    """
+    Split the courses into up to `num_shards` shards of whole components, with
+    similar numbers of courses. Each component goes, largest first, to the
+    shard with the fewest courses so far.
+    """
+    sizes = components.value_counts()
+    shard_sizes = [0] * num_shards
+    shard_components: list[list[int]] = [[] for _ in range(num_shards)]
+    for component in sorted(sizes.index, key=lambda c: (-sizes[c], c)):
+        shard = min(range(num_shards), key=lambda i: (shard_sizes[i], i))
+        shard_sizes[shard] += sizes[component]
+        shard_components[shard].append(component)
+    return [
+        components.index[components.isin(shard)] for shard in shard_components if shard
+    ]
+
+
+def partition_same_courses_parallel(
+    data: pd.DataFrame,
+    listings: pd.DataFrame,
+    distance_cache: DistanceCache | None = None,
+    workers: int | None = None,
+    components: pd.Series | None = None,
+) -> pd.Series:
+    """
+    Same as partition_same_courses, but spreads the independent components (see
+    find_dependent_components) over a pool of `workers` processes.
+    """
+    data = data[data.index.isin(listings["course_id"])]
+    if workers == 1 or data.empty:
+        return partition_same_courses(data, listings, distance_cache)
+    if components is None:
+        components = find_dependent_components(data, listings)
+    shards = plan_shards(components, workers or os.cpu_count() or 1)
+    if len(shards) == 1:
+        return partition_same_courses(data, listings, distance_cache)
+    same_course_ids: list[pd.Series] = []
+    with concurrent.futures.ProcessPoolExecutor(
+        workers,
+        initializer=init_partition_worker,
+        initargs=(distance_cache.path if distance_cache else None,),
+    ) as executor:
+        futures = [
+            executor.submit(
+                partition_shard,
+                data.loc[course_ids],
+                listings[listings["course_id"].isin(course_ids)],
+            )
+            for course_ids in shards
+        ]
+        # Collect in submission order, so the result does not depend on timing
+        for future in tqdm(futures, desc="Partitioning shards", leave=False):
+            same_course_id, updates = future.result()
+            same_course_ids.append(same_course_id)
+            if distance_cache and updates:
+                distance_cache.apply_updates(updates)
+    return pd.concat(same_course_ids)
+
+
+def partition_same_courses_incremental(
+    data: pd.DataFrame,
+    listings: pd.DataFrame,
+    previous_components: dict[str, list[list[int]]],
+    distance_cache: DistanceCache | None = None,
+    workers: int | None = 1,
+) -> tuple[pd.Series, dict[str, list[list[int]]]]:
+    """
+    Like partition_same_courses, but reuses the (course_id, same_course_id)
+    pairs of every component whose fingerprint is in `previous_components`.
+    Also returns the pairs of all current components, by fingerprint.
+    """
+    data = data[data.index.isin(listings["course_id"])]
+    components = find_dependent_components(data, listings)
+    fingerprints = component_fingerprints(data, listings, components)
+    reused = fingerprints[fingerprints.isin(previous_components)]
+    stale_ids = data.index[~components.isin(reused.index)]
+    same_course_ids = [
+        pd.Series(dict(previous_components[fingerprint]), dtype=int)
+        for fingerprint in reused
+    ]
+    if len(stale_ids):
+        stale_same_course_id = partition_same_courses_parallel(
+            data.loc[stale_ids],
+            listings[listings["course_id"].isin(stale_ids)],
+            distance_cache,
+            workers,
+            components[stale_ids],
+        )
+        same_course_ids.append(stale_same_course_id)
+    same_course_id = pd.concat(same_course_ids) if same_course_ids else pd.Series()
+    print(
+        f"Reused {len(reused)} of {len(fingerprints)} same-course components, "
+        + f"partitioned {len(stale_ids)} of {len(data)} courses"
+    )
+    current_components = {
+        fingerprints[component]: [
+            [int(course_id), int(same_course_id[course_id])] for course_id in ids
+        ]
+        for component, ids in components.groupby(components).groups.items()
+    }
+    return same_course_id, current_components
+
+
+def all_same_course(group: pd.DataFrame, same_course_partitions: UnionFind):
+    return same_course_partitions.all_connected(group.index)
 
 
 # We partition all the course IDs based on whether they were in the same
 # department, or were taught by the same professor
 def merge_same_title_courses(
     same_title_group: pd.DataFrame,
-    same_course_partitions: DisjointSet,
-    have_cross_listed: DisjointSet,
+    same_course_partitions: UnionFind,
+    have_cross_listed: UnionFind,
 ):
     dep_to_course_ids = reverse_map(
         same_title_group["course_codes"].apply(
@@ -337,18 +726,14 @@ def merge_same_title_courses(
 def merge_by_similar_text(
     same_code_group: pd.DataFrame,
     attr: str,
-    same_course_partitions: DisjointSet,
-    all_data: pd.DataFrame,
+    same_course_partitions: UnionFind,
     merge_same_text: bool = True,
+    distance_cache: DistanceCache | None = None,
 ):
     # Merging by similar text should only cause courses from different times to be merged.
     # We avoid merging two courses in the same season.
     def merge_if_different_season(id1: int, id2: int):
-        subset1 = same_course_partitions.subset(id1)
-        subset2 = same_course_partitions.subset(id2)
-        subset1_seasons = all_data.loc[list(subset1), "season_code"]
-        subset2_seasons = all_data.loc[list(subset2), "season_code"]
-        if set(subset1_seasons) & set(subset2_seasons):
+        if same_course_partitions.share_label(id1, id2):
             return
         same_course_partitions.merge(id1, id2)
 
@@ -359,14 +744,22 @@ def merge_by_similar_text(
                 merge_if_different_season(id1, id2)
         if all_same_course(same_code_group, same_course_partitions):
             return
-    for (a, group1), (b, group2) in itertools.combinations(
-        attr_to_course_ids.items(), 2
+    candidates = None
+    if PRUNE_CANDIDATE_PAIRS and len(attr_to_course_ids) >= MIN_PRUNE_GROUP_SIZE:
+        candidates = CandidatePairs(list(attr_to_course_ids.index), attr)
+    for (i, (a, group1)), (j, (b, group2)) in itertools.combinations(
+        enumerate(attr_to_course_ids.items()), 2
     ):
         # Courses within each group are already merged, so we only need to
         # merge the first two if needed
         if same_course_partitions.connected(group1[0], group2[0]):
             continue
-        if distance_in_bounds(cast(str, a), cast(str, b), attr) >= 0:
+        if candidates is not None and (i, j) not in candidates:
+            continue
+        if (
+            cached_distance_in_bounds(cast(str, a), cast(str, b), attr, distance_cache)
+            >= 0
+        ):
             # print(f"Merge\n{subdata.loc[group1, ["title", "season_code", "course_codes"]]}\nand\n{subdata.loc[group2, ["title", "season_code", "course_codes"]]}\nbased on {attr}:\n{a}\n{b}")
             merge_if_different_season(group1[0], group2[0])
 
@@ -377,7 +770,8 @@ def merge_same_code_courses(
     same_code_ids: pd.Series,
     listings: pd.DataFrame,
     data: pd.DataFrame,
-    same_course_partitions: DisjointSet,
+    same_course_partitions: UnionFind,
+    distance_cache: DistanceCache | None = None,
 ):
     # Pretend the old courses were also offered with the new codes
     if same_code_ids.name in code_changes:
@@ -395,15 +789,24 @@ def merge_same_code_courses(
     if all_same_course(same_code_group, same_course_partitions):
         return
     merge_by_similar_text(
-        same_code_group, "title_norm", same_course_partitions, data, False
+        same_code_group,
+        "title_norm",
+        same_course_partitions,
+        False,
+        distance_cache,
     )
     if all_same_course(same_code_group, same_course_partitions):
         return
-    merge_by_similar_text(same_code_group, "description", same_course_partitions, data)
+    merge_by_similar_text(
+        same_code_group,
+        "description",
+        same_course_partitions,
+        distance_cache=distance_cache,
+    )
 
 
 def map_course_id_to_same_course_id(
-    same_course_partitions: DisjointSet, data: pd.DataFrame
+    same_course_partitions: UnionFind, data: pd.DataFrame
 ):
     course_id_to_same_course_id: dict[int, int] = {}
     for subset in same_course_partitions.subsets():
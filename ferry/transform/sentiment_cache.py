@@ -0,0 +1,96 @@
+"""
+A persistent cache of VADER sentiment scores across runs.
+
+Scoring every narrative comment is the most expensive part of the transform,
+but comments from past seasons never change. Scores are keyed by a hash of the
+comment text and the vaderSentiment version, so upgrading VADER rescores
+everything instead of returning stale results.
+"""
+
+import hashlib
+import sqlite3
+from importlib.metadata import version
+from pathlib import Path
+
+import pandas as pd
+
+SENTIMENT_COLUMNS = ["comment_neg", "comment_neu", "comment_pos", "comment_compound"]
+
+
+def comment_key(comment: str, vader_version: str) -> bytes:
+    return hashlib.blake2b(
+        f"{vader_version}\0{comment}".encode(), digest_size=16
+    ).digest()
+
+
+class SentimentCache:
+    def __init__(self, path: Path):
+        path.parent.mkdir(parents=True, exist_ok=True)
+        self.conn = sqlite3.connect(path)
+        self.conn.execute(
+            """
+            CREATE TABLE IF NOT EXISTS sentiments (
+                key BLOB PRIMARY KEY,
+                comment_neg REAL NOT NULL,
+                comment_neu REAL NOT NULL,
+                comment_pos REAL NOT NULL,
+                comment_compound REAL NOT NULL
+            )
+            """
+        )
+        self.vader_version = version("vaderSentiment")
+        self.hits = 0
+        self.misses = 0
+
+    def keys(self, comments: pd.Series) -> pd.Series:
+        return comments.map(lambda comment: comment_key(comment, self.vader_version))
+
+    def get(self, keys: pd.Series) -> pd.DataFrame:
+        """
+        Look up the scores of `keys`. Returns a frame with the same index and one
+        column per score; uncached keys have NaN scores.
+        """
+        # Join against the requested keys instead of reading the whole table,
+        # which keeps growing with every season of comments
+        self.conn.execute(
+            "CREATE TEMP TABLE IF NOT EXISTS lookup (key BLOB PRIMARY KEY)"
+        )
+        with self.conn:
+            self.conn.execute("DELETE FROM lookup")
+            self.conn.executemany(
+                "INSERT OR IGNORE INTO lookup (key) VALUES (?)",
+                ((key,) for key in keys),
+            )
+        cached = pd.read_sql_query(
+            f"SELECT key, {', '.join(SENTIMENT_COLUMNS)} "
+            + "FROM lookup JOIN sentiments USING (key)",
+            self.conn,
+        ).set_index("key")
+        scores = cached.reindex(keys.to_numpy()).set_axis(keys.index).astype(float)
+        found = scores["comment_compound"].notna()
+        self.hits += int(found.sum())
+        self.misses += int((~found).sum())
+        return scores
+
+    def put(self, keys: pd.Series, scores: pd.DataFrame):
+        with self.conn:
+            self.conn.executemany(
+                "INSERT OR REPLACE INTO sentiments "
+                + f"(key, {', '.join(SENTIMENT_COLUMNS)}) VALUES (?, ?, ?, ?, ?)",
+                zip(
+                    keys,
+                    *(scores[column].astype(float) for column in SENTIMENT_COLUMNS),
+                    strict=True,
+                ),
+            )
+
+    def stats(self) -> str:
+        total = self.hits + self.misses
+        hit_rate = self.hits / total if total else 0
+        return (
+            f"Sentiment cache: {self.hits} hits, {self.misses} misses "
+            + f"({hit_rate:.1%} hit rate)"
+        )
+
+    def close(self):
+        self.conn.close()
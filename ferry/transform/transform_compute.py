@@ -1,7 +1,8 @@
+import concurrent.futures
+import itertools
 import logging
-import math
-import re
-from typing import cast
+from pathlib import Path
+from typing import TypedDict
 
 import numpy as np
 import pandas as pd
@@ -12,6 +13,107 @@ from ferry.transform.same_courses import (
     resolve_historical_courses,
     split_same_professors,
 )
+from ferry.transform.sentiment_cache import SENTIMENT_COLUMNS, SentimentCache
+
+
+def group_rating_averages(
+    course_to_group: pd.Series, ratings: pd.DataFrame
+) -> pd.DataFrame:
+    """
+    Mean and number of non-null values of each column of `ratings` (indexed by
+    course_id) over the courses of each group.
+
+    `course_to_group` maps course_id to group id; a course may appear in several
+    groups. Returns a frame indexed by group id, with a (column, "mean") and a
+    (column, "count") column per rating column. Counts are Int64.
+    """
+    long_ratings = (
+        course_to_group.rename("group_id").to_frame().join(ratings, how="left")
+    )
+    averages = long_ratings.groupby("group_id")[list(ratings.columns)].agg(
+        ["mean", "count"]
+    )
+    for column in ratings.columns:
+        averages[(column, "count")] = averages[(column, "count")].astype(
+            pd.Int64Dtype()
+        )
+    return averages
+
+
+class TagRule(TypedDict, total=False):
+    # Regular expressions that must all match the lowercased question text
+    keywords: list[str]
+    # Regular expressions that must not match the lowercased question text
+    excluded_keywords: list[str]
+    excluded_codes: list[str]
+    # If present, the question's is_narrative must equal this
+    is_narrative: bool
+
+
+# Each question gets the tag whose rule it matches. A question matching more
+# than one rule is an error; adjust the rules to disambiguate.
+question_tag_rules: dict[str, TagRule] = {
+    "Available resources": {"keywords": ["resources"]},
+    "Engagement": {"keywords": ["engagement"]},
+    # DR464: "Please provide feedback on the instructor's teaching style,
+    # speaking and listening skills, and time management."
+    "Feedback": {"keywords": ["feedback"], "excluded_codes": ["DR464"]},
+    "Intellectual challenge": {"keywords": ["intellectual challenge"]},
+    "Major": {"keywords": ["major"]},
+    "Organization": {"keywords": ["organize"]},
+    # DR113, DR316: "I would recommend this instructor to other students."
+    "Professor": {
+        "keywords": ["rating|assessment|evaluate", "instructor"],
+        "excluded_codes": ["DR113", "DR316"],
+    },
+    "Overall": {
+        "keywords": ["overall assessment"],
+        "excluded_keywords": ["instructor"],
+        # This one is used in rating average
+        "is_narrative": False,
+    },
+    # DR113, DR316: "I would recommend this instructor to other students."
+    "Recommend": {"keywords": ["recommend"], "excluded_codes": ["DR113", "DR316"]},
+    # SU122: "How will you use the knowledge and skills you learned in
+    # this course in your future endeavors?"
+    # FS1003: "How well did the knowledge, skills, and insights gained
+    # in this class align with your expectations?"
+    # DR464: "Please provide feedback on the instructor's teaching style,
+    # speaking and listening skills, and time management."
+    # These question codes cause conflicts with other Skills questions
+    "Skills": {
+        "keywords": ["skills"],
+        "excluded_codes": ["SU122", "FS1003", "DR464"],
+    },
+    "Strengths/weaknesses": {
+        "keywords": ["strengths and weaknesses", "course"],
+        "excluded_keywords": ["teaching assistant", "instructor"],
+    },
+    "Summary": {"keywords": ["summarize"], "excluded_keywords": ["recommend"]},
+    # This one is used in rating average
+    "Workload": {"keywords": ["workload"], "is_narrative": False},
+}
+
+
+def match_tag_rules(
+    questions: pd.DataFrame, rules: dict[str, TagRule] = question_tag_rules
+) -> pd.DataFrame:
+    """
+    Evaluate tag rules on questions (with question_code, question_text, and
+    is_narrative columns). Returns a boolean frame with one column per tag.
+    """
+    text = questions["question_text"].str.lower()
+    matches: dict[str, pd.Series] = {}
+    for tag, rule in rules.items():
+        match = ~questions["question_code"].isin(rule.get("excluded_codes", []))
+        for keyword in rule.get("keywords", []):
+            match &= text.str.contains(keyword, na=False)
+        for keyword in rule.get("excluded_keywords", []):
+            match &= ~text.str.contains(keyword, na=False)
+        if "is_narrative" in rule:
+            match &= questions["is_narrative"] == rule["is_narrative"]
+        matches[tag] = match
+    return pd.DataFrame(matches, index=questions.index, columns=list(rules))
 
 
 def questions_computed(evaluation_questions: pd.DataFrame) -> pd.DataFrame:
@@ -23,60 +125,22 @@ def questions_computed(evaluation_questions: pd.DataFrame) -> pd.DataFrame:
 
     logging.debug("Assigning question tags")
 
-    def assign_code(row: pd.Series):
-        text = cast(str, row["question_text"]).lower()
-
-        tag_candidates = {
-            "Available resources": "resources" in text,
-            "Engagement": "engagement" in text,
-            # DR464: "Please provide feedback on the instructor's teaching style,
-            # speaking and listening skills, and time management."
-            "Feedback": "feedback" in text and row["question_code"] not in ["DR464"],
-            "Intellectual challenge": "intellectual challenge" in text,
-            "Major": "major" in text,
-            "Organization": "organize" in text,
-            # DR113, DR316: "I would recommend this instructor to other students."
-            "Professor": bool(re.search(r"rating|assessment|evaluate", text))
-            and "instructor" in text
-            and row["question_code"] not in ["DR113", "DR316"],
-            "Overall": "overall assessment" in text
-            and "instructor" not in text
-            # This one is used in rating average
-            and not row["is_narrative"],
-            # DR113, DR316: "I would recommend this instructor to other students."
-            "Recommend": "recommend" in text
-            and row["question_code"] not in ["DR113", "DR316"],
-            # SU122: "How will you use the knowledge and skills you learned in
-            # this course in your future endeavors?"
-            # FS1003: "How well did the knowledge, skills, and insights gained
-            # in this class align with your expectations?"
-            # DR464: "Please provide feedback on the instructor's teaching style,
-            # speaking and listening skills, and time management."
-            # These question codes cause conflicts with other Skills questions
-            "Skills": "skills" in text
-            and row["question_code"] not in ["SU122", "FS1003", "DR464"],
-            "Strengths/weaknesses": "strengths and weaknesses" in text
-            and "course" in text
-            and "teaching assistant" not in text
-            and "instructor" not in text,
-            "Summary": "summarize" in text and "recommend" not in text,
-            # This one is used in rating average
-            "Workload": "workload" in text and not row["is_narrative"],
-        }
-
-        if sum(tag_candidates.values()) > 1:
-            raise database.InvariantError(
-                f"{row['question_code']} {row['question_text']} contains multiple tags {', '.join([tag for tag, condition in tag_candidates.items() if condition])}. Please adjust the conditions above."
-            )
-
-        return next(
-            (tag for tag, condition in tag_candidates.items() if condition), None
+    if len(evaluation_questions) == 0:
+        evaluation_questions["tag"] = pd.Series(dtype="string")
+        return evaluation_questions
+
+    matches = match_tag_rules(evaluation_questions)
+    num_tags = matches.sum(axis=1)
+    if (num_tags > 1).any():
+        conflict = num_tags.index[num_tags > 1][0]
+        question = evaluation_questions.loc[conflict]
+        tags = matches.columns[matches.loc[conflict]]
+        raise database.InvariantError(
+            f"{question['question_code']} {question['question_text']} contains multiple tags {', '.join(tags)}. Please adjust question_tag_rules."
         )
 
     evaluation_questions["tag"] = (
-        pd.Series(dtype="string")
-        if len(evaluation_questions) == 0
-        else evaluation_questions.apply(assign_code, axis=1)
+        matches.idxmax(axis=1).astype(object).where(num_tags == 1, None)
     )
 
     return evaluation_questions
@@ -90,7 +154,40 @@ def sentiment_analysis(text: str) -> tuple[float, float, float, float]:
     return sentiment["neg"], sentiment["neu"], sentiment["pos"], sentiment["compound"]
 
 
-def narratives_computed(evaluation_narratives: pd.DataFrame) -> pd.DataFrame:
+# Uncached comments are scored in a process pool, in batches of this size
+SENTIMENT_BATCH_SIZE = 1000
+
+
+def sentiment_analysis_batch(
+    comments: list[str],
+) -> list[tuple[float, float, float, float]]:
+    return [sentiment_analysis(comment) for comment in comments]
+
+
+def score_comments(comments: pd.Series, workers: int | None) -> pd.DataFrame:
+    batches = [
+        comments.iloc[i : i + SENTIMENT_BATCH_SIZE].tolist()
+        for i in range(0, len(comments), SENTIMENT_BATCH_SIZE)
+    ]
+    if workers == 1 or len(batches) <= 1:
+        scores = [sentiment_analysis_batch(batch) for batch in batches]
+    else:
+        with concurrent.futures.ProcessPoolExecutor(workers) as executor:
+            scores = list(executor.map(sentiment_analysis_batch, batches))
+    return pd.DataFrame(
+        list(itertools.chain.from_iterable(scores)),
+        index=comments.index,
+        columns=SENTIMENT_COLUMNS,
+        dtype=float,
+    )
+
+
+def narratives_computed(
+    evaluation_narratives: pd.DataFrame,
+    cache_dir: Path | None = None,
+    skip_sentiment: bool = False,
+    workers: int | None = None,
+) -> pd.DataFrame:
     """
     Populate the following fields on evaluation_narratives:
 
@@ -98,25 +195,55 @@ def narratives_computed(evaluation_narratives: pd.DataFrame) -> pd.DataFrame:
     - comment_neu
     - comment_pos
     - comment_compound
+
+    Scores are cached in `cache_dir`, so each comment is only scored once across
+    runs; new comments are scored in `workers` processes (all cores if None).
+    With `skip_sentiment`, all scores are 0.
     """
     logging.debug("Computing comment sentiment")
 
-    # (
-    #     evaluation_narratives["comment_neg"],
-    #     evaluation_narratives["comment_neu"],
-    #     evaluation_narratives["comment_pos"],
-    #     evaluation_narratives["comment_compound"],
-    # ) = zip(*evaluation_narratives["comment"].apply(sentiment_analysis))
-
-    # TODO: the sentiment analysis is by far the most costly, we need to cache it
-    # We don't use this actually so it's fine for now
-    evaluation_narratives["comment_neg"] = 0
-    evaluation_narratives["comment_neu"] = 0
-    evaluation_narratives["comment_pos"] = 0
-    evaluation_narratives["comment_compound"] = 0
+    if skip_sentiment:
+        evaluation_narratives[SENTIMENT_COLUMNS] = 0
+        return evaluation_narratives
+
+    comments = pd.Series(evaluation_narratives["comment"].unique())
+    if cache_dir:
+        cache = SentimentCache(cache_dir / "sentiment_cache.sqlite")
+        keys = cache.keys(comments)
+        scores = cache.get(keys)
+        uncached = scores["comment_compound"].isna()
+        if uncached.any():
+            new_scores = score_comments(comments[uncached], workers)
+            scores.loc[uncached] = new_scores
+            cache.put(keys[uncached], new_scores)
+        cache.close()
+        print(cache.stats())
+    else:
+        scores = score_comments(comments, workers)
+
+    positions = pd.Index(comments).get_indexer(evaluation_narratives["comment"])
+    evaluation_narratives[SENTIMENT_COLUMNS] = scores.to_numpy()[positions]
     return evaluation_narratives
 
 
+def rating_matrix(ratings: pd.Series) -> tuple[np.ndarray, np.ndarray]:
+    """
+    Pack rating histograms (lists of counts per option) into a zero-padded
+    (n_rows x max_options) integer array. Also returns the number of options of
+    each row.
+    """
+    lengths = np.fromiter(map(len, ratings), dtype=np.int64, count=len(ratings))
+    counts = np.zeros((len(ratings), lengths.max(initial=0)), dtype=np.int64)
+    rows = np.repeat(np.arange(len(ratings)), lengths)
+    columns = np.arange(lengths.sum()) - np.repeat(
+        np.cumsum(lengths) - lengths, lengths
+    )
+    counts[rows, columns] = np.fromiter(
+        itertools.chain.from_iterable(ratings), dtype=np.int64, count=lengths.sum()
+    )
+    return counts, lengths
+
+
 def evaluation_statistics_computed(
     evaluation_statistics: pd.DataFrame,
     evaluation_ratings: pd.DataFrame,
@@ -141,36 +268,43 @@ def evaluation_statistics_computed(
 
     # Get average rating for each course with a specified tag
     def average_by_course(question_tag: str, n_categories: int) -> pd.Series:
-        tagged_ratings = evaluation_ratings[evaluation_ratings["tag"] == question_tag]
-        # course_id -> Series[list[int]]
-        rating_by_course = tagged_ratings.groupby("course_id")[
-            ["rating", "question_code"]
-        ]
-        if len(rating_by_course) == 0:
+        tagged_ratings = evaluation_ratings[
+            evaluation_ratings["tag"] == question_tag
+        ].sort_values("course_id", kind="stable")
+        if len(tagged_ratings) == 0:
             return pd.Series()
 
-        def average_rating(data: pd.DataFrame) -> float:
-            # A course can have multiple questions of the same type. This usually
-            # happens when the course is cross-listed between GS and YC
-            weights = [sum(x) for x in zip(*data["rating"])]
-
-            # DR359: How appropriate was the workload? has six options
-            # In general, for all other question codes (e.g., YC408)
-            # the workload should have 5 categories (n_categories = 5)
-            # but this one also qualifies as a "workload" question, so we still assign it
-            # the "workload" tag
-            if (
-                len(weights) != n_categories
-                and not (data["question_code"] == "DR359").all()
-            ):
-                raise database.InvariantError(
-                    f"Invalid number of categories for {question_tag}: {len(weights)}"
-                )
-            if sum(weights) == 0:
-                return np.nan
-            return cast(float, np.average(range(1, len(weights) + 1), weights=weights))
-
-        return rating_by_course.apply(average_rating)
+        course_ids, course_starts = np.unique(
+            tagged_ratings["course_id"].to_numpy(), return_index=True
+        )
+        counts, lengths = rating_matrix(tagged_ratings["rating"])
+        # A course can have multiple questions of the same type. This usually
+        # happens when the course is cross-listed between GS and YC. Their
+        # counts are summed, over the options that all of them have.
+        n_options = np.minimum.reduceat(lengths, course_starts)
+        counts = np.add.reduceat(counts, course_starts, axis=0)
+        counts[np.arange(counts.shape[1]) >= n_options[:, None]] = 0
+
+        # DR359: How appropriate was the workload? has six options
+        # In general, for all other question codes (e.g., YC408)
+        # the workload should have 5 categories (n_categories = 5)
+        # but this one also qualifies as a "workload" question, so we still assign it
+        # the "workload" tag
+        all_dr359 = np.logical_and.reduceat(
+            tagged_ratings["question_code"].to_numpy() == "DR359", course_starts
+        )
+        invalid = (n_options != n_categories) & ~all_dr359
+        if invalid.any():
+            raise database.InvariantError(
+                f"Invalid number of categories for {question_tag}: "
+                + f"{n_options[invalid][0]}"
+            )
+
+        totals = counts.sum(axis=1)
+        weighted = counts @ np.arange(1, counts.shape[1] + 1)
+        with np.errstate(invalid="ignore", divide="ignore"):
+            averages = np.where(totals == 0, np.nan, weighted / totals)
+        return pd.Series(averages, index=pd.Index(course_ids, name="course_id"))
 
     # get overall and workload ratings
     evaluation_statistics["avg_rating"] = average_by_course("Overall", 5)
@@ -185,6 +319,9 @@ def courses_computed(
     evaluation_statistics: pd.DataFrame,
     course_professors: pd.DataFrame,
     professors: pd.DataFrame,
+    cache_dir: Path | None = None,
+    incremental: bool = False,
+    workers: int | None = 1,
 ) -> pd.DataFrame:
     """
     Populates computed course rating fields:
@@ -209,6 +346,11 @@ def courses_computed(
             If recent previous offering with enrollment statistics was with same professors.
 
     Must be called after professors_computed because it uses the average_rating of each professor.
+
+    If `cache_dir` is given, same-course text distances are memoized there.
+    With `incremental`, the same-course groups are also snapshotted there, and
+    groups of courses that did not change since the last snapshot are reused.
+    Same-course resolution runs in `workers` processes (all cores if None).
     """
     logging.debug("Computing courses")
 
@@ -219,7 +361,18 @@ def courses_computed(
     )
 
     same_course_id, same_course_to_courses = resolve_historical_courses(
-        courses, listings, course_to_professors
+        courses,
+        listings,
+        course_to_professors,
+        distance_cache_path=(
+            cache_dir / "same_course_distances.sqlite" if cache_dir else None
+        ),
+        snapshot_path=(
+            cache_dir / "same_course_snapshot.json"
+            if cache_dir and incremental
+            else None
+        ),
+        workers=workers,
     )
 
     # Split same-course partition by same-professors
@@ -233,38 +386,45 @@ def courses_computed(
     logging.debug("Computing last offering statistics")
 
     # course_id for all evaluated courses
-    course_with_enrollment = set(
-        evaluation_statistics.dropna(subset=["enrolled"], axis=0).index
+    course_with_enrollment = evaluation_statistics.dropna(
+        subset=["enrolled"], axis=0
+    ).index
+
+    # All offerings of each same-course group, in chronological order
+    offerings = (
+        courses.loc[
+            courses["same_course_id"].notna(), ["same_course_id", "season_code"]
+        ]
+        .rename_axis("course_id")
+        .reset_index()
+        .astype({"course_id": pd.Int64Dtype()})
+        .sort_values(["same_course_id", "season_code", "course_id"])
     )
-
-    course_to_last_offered: dict[int, int | None] = {}
-    course_to_last_enrollment: dict[int, int | None] = {}
-
-    for same_course_group in same_course_to_courses.values():
-        ids_by_season = (
-            courses.loc[same_course_group]
-            .groupby("season_code")
-            .apply(lambda x: x.index.tolist())
-            .tolist()
-        )
-        for i, course_ids in enumerate(ids_by_season):
-            for course_id in course_ids:
-                course_to_last_offered[course_id] = (
-                    ids_by_season[i - 1][0] if i > 0 else None
-                )
-        last_enrollment_id = None
-        for i, course_ids in enumerate(ids_by_season):
-            for course_id in course_ids:
-                course_to_last_enrollment[course_id] = last_enrollment_id
-                if course_id in course_with_enrollment:
-                    last_enrollment_id = course_id
-
-    courses["last_offered_course_id"] = pd.Series(
-        course_to_last_offered, dtype=pd.Int64Dtype()
+    # The last offering is the first course of the previous season in the group
+    season_firsts = offerings.drop_duplicates(["same_course_id", "season_code"])
+    season_firsts = season_firsts.assign(
+        last_offered_course_id=season_firsts.groupby("same_course_id")[
+            "course_id"
+        ].shift()
+    ).drop(columns="course_id")
+    offerings = offerings.merge(
+        season_firsts, on=["same_course_id", "season_code"], how="left"
+    )
+    # The last enrollment is the closest preceding offering (including earlier
+    # courses of the same season) that has enrollment statistics
+    enrolled_course_id = offerings["course_id"].where(
+        offerings["course_id"].isin(course_with_enrollment)
     )
-    courses["last_enrollment_course_id"] = pd.Series(
-        course_to_last_enrollment, dtype=pd.Int64Dtype()
+    offerings["last_enrollment_course_id"] = (
+        enrolled_course_id.groupby(offerings["same_course_id"])
+        .shift()
+        .groupby(offerings["same_course_id"])
+        .ffill()
     )
+    offerings = offerings.set_index("course_id")
+
+    courses["last_offered_course_id"] = offerings["last_offered_course_id"]
+    courses["last_enrollment_course_id"] = offerings["last_enrollment_course_id"]
     courses["last_enrollment_season_code"] = courses["last_enrollment_course_id"].map(
         courses["season_code"]
     )
@@ -277,82 +437,29 @@ def courses_computed(
 
     logging.debug("Computing historical ratings for courses")
 
-    # map courses to ratings - use dictionaries instead of lambda functions for memory efficiency
-    course_to_overall = evaluation_statistics["avg_rating"].to_dict()
-    course_to_workload = evaluation_statistics["avg_workload"].to_dict()
-
-    # Pre-compute aggregated ratings for each same_course group to avoid repeated list creation
-    logging.debug("Pre-computing same-course rating aggregates")
-
-    def compute_aggregate_rating(
-        course_ids: list[int], rating_dict: dict[int, float | None]
-    ) -> tuple[float | None, int]:
-        """Compute average rating directly without creating intermediate lists"""
-        ratings = [rating_dict.get(cid) for cid in course_ids]
-        ratings = [x for x in ratings if x is not None and not math.isnan(x)]
-        if not ratings:
-            return None, 0
-        return sum(ratings) / len(ratings), len(ratings)
-
-    # Build aggregated ratings directly for same_course groups
-    same_course_rating_agg = {}
-    same_course_workload_agg = {}
-    for same_id, course_ids in same_course_to_courses.items():
-        same_course_rating_agg[same_id] = compute_aggregate_rating(
-            course_ids, course_to_overall
-        )
-        same_course_workload_agg[same_id] = compute_aggregate_rating(
-            course_ids, course_to_workload
-        )
-
-    # Build aggregated ratings for same_course_and_profs groups
-    same_prof_rating_agg = {}
-    same_prof_workload_agg = {}
-    for same_prof_id, course_ids in same_prof_course_to_courses.items():
-        same_prof_rating_agg[same_prof_id] = compute_aggregate_rating(
-            course_ids, course_to_overall
-        )
-        same_prof_workload_agg[same_prof_id] = compute_aggregate_rating(
-            course_ids, course_to_workload
-        )
-
-    # Map pre-computed aggregates to courses
-    logging.debug("Mapping aggregated ratings to courses")
-    courses["average_rating"], courses["average_rating_n"] = zip(
-        *courses["same_course_id"].map(same_course_rating_agg)
-    )
-    courses["average_workload"], courses["average_workload_n"] = zip(
-        *courses["same_course_id"].map(same_course_workload_agg)
+    same_course_ratings = group_rating_averages(
+        courses["same_course_id"], evaluation_statistics[["avg_rating", "avg_workload"]]
     )
-    (
-        courses["average_rating_same_professors"],
-        courses["average_rating_same_professors_n"],
-    ) = zip(*courses["same_course_and_profs_id"].map(same_prof_rating_agg))
-    (
-        courses["average_workload_same_professors"],
-        courses["average_workload_same_professors_n"],
-    ) = zip(*courses["same_course_and_profs_id"].map(same_prof_workload_agg))
-
-    # Convert to proper dtypes
-    courses["average_rating_n"] = courses["average_rating_n"].astype(pd.Int64Dtype())
-    courses["average_workload_n"] = courses["average_workload_n"].astype(
-        pd.Int64Dtype()
-    )
-    courses["average_rating_same_professors_n"] = courses[
-        "average_rating_same_professors_n"
-    ].astype(pd.Int64Dtype())
-    courses["average_workload_same_professors_n"] = courses[
-        "average_workload_same_professors_n"
-    ].astype(pd.Int64Dtype())
-
-    # Clean up temporary dictionaries
-    del (
-        same_course_rating_agg,
-        same_course_workload_agg,
-        same_prof_rating_agg,
-        same_prof_workload_agg,
+    same_prof_ratings = group_rating_averages(
+        courses["same_course_and_profs_id"],
+        evaluation_statistics[["avg_rating", "avg_workload"]],
     )
-    del course_to_overall, course_to_workload
+    for column, group_ratings, group_id in [
+        ("average_rating", same_course_ratings["avg_rating"], "same_course_id"),
+        ("average_workload", same_course_ratings["avg_workload"], "same_course_id"),
+        (
+            "average_rating_same_professors",
+            same_prof_ratings["avg_rating"],
+            "same_course_and_profs_id",
+        ),
+        (
+            "average_workload_same_professors",
+            same_prof_ratings["avg_workload"],
+            "same_course_and_profs_id",
+        ),
+    ]:
+        courses[column] = courses[group_id].map(group_ratings["mean"])
+        courses[f"{column}_n"] = courses[group_id].map(group_ratings["count"])
 
     courses["average_gut_rating"] = (
         courses["average_rating"] - courses["average_workload"]
@@ -387,41 +494,17 @@ def professors_computed(
     """
     logging.debug("Computing ratings for professors")
 
-    # Build rating dictionary for faster lookup (avoid large merge)
-    course_ratings = evaluation_statistics["avg_rating"].to_dict()
-
-    # Group by professor first, then lookup ratings - avoids creating huge merged dataframe
-    prof_course_groups = course_professors.groupby("professor_id")["course_id"].apply(
-        list
+    prof_to_ratings = group_rating_averages(
+        course_professors.set_index("course_id")["professor_id"],
+        evaluation_statistics[["avg_rating"]],
+    )["avg_rating"].rename(
+        columns={"mean": "average_rating", "count": "average_rating_n"}
     )
-
-    prof_rating_data = []
-    for prof_id, course_ids in prof_course_groups.items():
-        # Lookup ratings without creating intermediate lists
-        ratings = [course_ratings.get(cid) for cid in course_ids]
-        ratings = [r for r in ratings if r is not None and not np.isnan(r)]
-
-        if ratings:
-            mean = np.mean(ratings)
-        else:
-            mean = np.nan
-
-        prof_rating_data.append(
-            {
-                "professor_id": prof_id,
-                "average_rating": mean,
-                "average_rating_n": len(ratings),
-            }
-        )
-
-    prof_to_ratings = pd.DataFrame(prof_rating_data)
-
-    # Clean up temporary variables
-    del course_ratings, prof_course_groups
+    prof_to_ratings.index.name = "professor_id"
 
     professors = (
         professors.reset_index()
-        .merge(prof_to_ratings, how="left", on="professor_id")
+        .merge(prof_to_ratings.reset_index(), how="left", on="professor_id")
         .set_index("professor_id")
     )
     professors["average_rating_n"] = professors["average_rating_n"].astype(
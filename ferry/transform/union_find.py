@@ -0,0 +1,111 @@
+"""
+Union-find over dense integer indices, for partitioning courses.
+
+Elements are mapped to indices 0..n-1 once; parents and component sizes live
+in NumPy arrays. Each element can carry a label (e.g. its season), and every
+component keeps the bitset of its members' labels, so checking whether two
+components share a label is a single integer AND instead of building sets.
+"""
+
+from collections.abc import Hashable, Iterable
+
+import numpy as np
+
+
+class UnionFind:
+    def __init__(
+        self,
+        elements: Iterable[Hashable],
+        labels: Iterable[Hashable] | None = None,
+    ):
+        self.index: dict[Hashable, int] = {}
+        self.elements: list[Hashable] = []
+        label_list = list(labels) if labels is not None else None
+        label_bits: dict[Hashable, int] = {}
+        self.label_sets: list[int] = []
+        for i, element in enumerate(elements):
+            # Like scipy's DisjointSet, duplicate elements are ignored
+            if element in self.index:
+                continue
+            self.index[element] = len(self.elements)
+            self.elements.append(element)
+            if label_list is not None:
+                bit = label_bits.setdefault(label_list[i], len(label_bits))
+                self.label_sets.append(1 << bit)
+        self.parent = np.arange(len(self.elements))
+        self.size = np.ones(len(self.elements), dtype=np.int64)
+
+    def __len__(self) -> int:
+        return len(self.elements)
+
+    def find(self, i: int) -> int:
+        parent = self.parent
+        while parent[i] != i:
+            # Path halving
+            parent[i] = parent[parent[i]]
+            i = parent[i]
+        return int(i)
+
+    def root(self, x: Hashable) -> int:
+        return self.find(self.index[x])
+
+    def __getitem__(self, x: Hashable) -> Hashable:
+        """
+        The representative element of the component of `x`.
+        """
+        return self.elements[self.root(x)]
+
+    def connected(self, x: Hashable, y: Hashable) -> bool:
+        return self.root(x) == self.root(y)
+
+    def merge(self, x: Hashable, y: Hashable) -> bool:
+        """
+        Merge the components of `x` and `y`. Returns False if they were already
+        the same component.
+        """
+        root_x = self.root(x)
+        root_y = self.root(y)
+        if root_x == root_y:
+            return False
+        if self.size[root_x] < self.size[root_y]:
+            root_x, root_y = root_y, root_x
+        self.parent[root_y] = root_x
+        self.size[root_x] += self.size[root_y]
+        if self.label_sets:
+            self.label_sets[root_x] |= self.label_sets[root_y]
+        return True
+
+    def share_label(self, x: Hashable, y: Hashable) -> bool:
+        """
+        Whether any member of the component of `x` has the same label as any
+        member of the component of `y`.
+        """
+        return bool(self.label_sets[self.root(x)] & self.label_sets[self.root(y)])
+
+    def subset_size(self, x: Hashable) -> int:
+        return int(self.size[self.root(x)])
+
+    def all_connected(self, xs: Iterable[Hashable]) -> bool:
+        roots = {self.root(x) for x in xs}
+        return len(roots) <= 1
+
+    def roots(self) -> np.ndarray:
+        """
+        The root of every element, by index.
+        """
+        parent = self.parent
+        while True:
+            grandparent = parent[parent]
+            if np.array_equal(grandparent, parent):
+                return parent
+            parent[:] = grandparent
+
+    def subsets(self) -> list[set[Hashable]]:
+        roots = self.roots()
+        order = np.argsort(roots, kind="stable")
+        boundaries = np.flatnonzero(np.diff(roots[order])) + 1
+        return [
+            {self.elements[i] for i in group}
+            for group in np.split(order, boundaries)
+            if len(group)
+        ]
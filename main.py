@@ -4,12 +4,11 @@ from pathlib import Path
 
 import pandas as pd
 import uvloop
-from httpx import AsyncClient
 
 from ferry.args_parser import Args, get_args, parse_seasons_arg
-from ferry.crawler.cache import load_cache_json
+from ferry.crawler.cache import iter_cache_json, load_cache_json
 from ferry.crawler.cas_request import USER_AGENT
-from ferry.crawler.classes import crawl_classes
+from ferry.crawler.classes import CourseSearchClient, crawl_classes
 from ferry.crawler.evals import crawl_evals
 from ferry.crawler.seasons import fetch_seasons
 from ferry.database import sync_db_courses, sync_db_courses_old, sync_db_evals
@@ -29,7 +28,7 @@ async def start_crawl(args: Args) -> list[str]:
     classes = None
     # Initialize HTTPX client, only used for fetching classes (evals fetch
     # initializes its own client with CAS auth)
-    client = AsyncClient(timeout=None, headers={"User-Agent": USER_AGENT})
+    client = CourseSearchClient(timeout=None, headers={"User-Agent": USER_AGENT})
     if args.crawl_seasons:
         course_seasons = await fetch_seasons(
             data_dir=args.data_dir, client=client, use_cache=args.use_cache
@@ -51,21 +50,26 @@ async def start_crawl(args: Args) -> list[str]:
             except Exception as e:
                 print(f"Error parsing YCS personalization tokens: {e}")
 
-        classes = await crawl_classes(
+        parsed_courses = await crawl_classes(
             seasons=seasons,
             data_dir=args.data_dir,
+            cache_dir=args.cache_dir,
             cws_api_key=args.cws_api_key,
             client=client,
             use_cache=args.use_cache,
             pers=ycs_pers,
             cookie_header=args.ycs_cookie,
+            # Location data comes with the details, so re-fetch all of them
+            # when credentials are given
+            incremental=args.incremental and not args.ycs_cookie,
+            concurrency=args.class_concurrency,
         )
 
         # Validate that locations were fetched if credentials were provided
         if args.ycs_cookie and args.ycs_pers:
             location_count = 0
-            for season_courses in classes.values():
-                for course in season_courses:
+            for path in parsed_courses.values():
+                for course in iter_cache_json(path):
                     for meeting in course.get("meetings", []):
                         if meeting.get("location"):
                             location_count += 1
@@ -77,12 +81,17 @@ async def start_crawl(args: Args) -> list[str]:
                     "YCS credentials were provided but no locations were fetched. "
                     "This likely means the authentication failed or the credentials are invalid."
                 )
+        # Each season's courses are read lazily, when its evals are crawled
+        classes = {
+            season: iter_cache_json(path) for season, path in parsed_courses.items()
+        }
     if args.crawl_evals:
         await crawl_evals(
             cas_cookie=args.cas_cookie,
             seasons=seasons,
             data_dir=args.data_dir,
             courses=classes,
+            concurrency=args.eval_concurrency,
         )
 
     # Track seasons updated during crawl for catalog refresh endpoint
@@ -120,7 +129,13 @@ async def main():
     seasons = await start_crawl(args)
     tables = None
     if args.transform:
-        tables = await transform(data_dir=args.data_dir)
+        tables = await transform(
+            data_dir=args.data_dir,
+            cache_dir=args.cache_dir,
+            incremental=args.incremental_transform,
+            workers=args.transform_workers,
+            skip_sentiment=args.skip_sentiment,
+        )
     if args.snapshot_tables:
         assert tables
         write_csvs(tables, data_dir=args.data_dir)
@@ -0,0 +1,75 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+SEASONS = ["202101", "202103", "202201", "202202", "202203", "202301"]
+
+
+@pytest.fixture
+def catalog() -> dict[str, pd.DataFrame]:
+    """
+    A small synthetic catalog, shaped like the tables of `import_courses` and
+    `import_evaluations`. Course codes are offered in most seasons, with a few
+    new titles, shared and changing professors, unrated courses and missing
+    ratings, so that same-course groups of every size come up.
+    """
+    rng = np.random.default_rng(0)
+    courses = []
+    listings = []
+    course_professors = []
+    evaluation_statistics = []
+    course_id = 0
+    for code in range(40):
+        subject = ["CPSC", "MATH", "HIST", "ENGL"][code % 4]
+        description = " ".join(rng.choice(["data", "proof", "war", "poem"], 30))
+        for season in SEASONS:
+            if rng.random() < 0.2:
+                continue
+            title = f"Course {code}" if rng.random() < 0.9 else f"Topics {code}"
+            courses.append(
+                {
+                    "course_id": course_id,
+                    "season_code": season,
+                    "title": title,
+                    "description": description,
+                }
+            )
+            listings.append(
+                {
+                    "course_id": course_id,
+                    "season_code": season,
+                    "course_code": f"{subject} {100 + code}",
+                    "section": "1",
+                }
+            )
+            for professor_id in rng.choice(8, rng.integers(0, 3), replace=False):
+                course_professors.append(
+                    {"course_id": course_id, "professor_id": int(professor_id)}
+                )
+            if rng.random() < 0.85:
+                evaluation_statistics.append(
+                    {
+                        "course_id": course_id,
+                        "enrolled": int(rng.integers(5, 200)),
+                        # Ratings with many significant digits, like real averages
+                        "avg_rating": (
+                            rng.uniform(1, 5) if rng.random() < 0.9 else np.nan
+                        ),
+                        "avg_workload": (
+                            rng.uniform(1, 5) if rng.random() < 0.9 else np.nan
+                        ),
+                    }
+                )
+            course_id += 1
+    return {
+        "courses": pd.DataFrame(courses).set_index("course_id"),
+        "listings": pd.DataFrame(listings),
+        "course_professors": pd.DataFrame(course_professors),
+        "evaluation_statistics": pd.DataFrame(evaluation_statistics).set_index(
+            "course_id"
+        ),
+        # Professor 8 never taught a course in the catalog
+        "professors": pd.DataFrame(
+            {"professor_id": range(9), "name": [f"Prof {i}" for i in range(9)]}
+        ).set_index("professor_id"),
+    }
@@ -0,0 +1,147 @@
+"""
+Round-trip tests for the Parquet encoding of `columnar_cache`, over the tables
+the importers produce.
+"""
+
+import json
+import random
+from pathlib import Path
+
+import pandas as pd
+import pytest
+
+from ferry.transform.columnar_cache import read_parquet, write_parquet
+from ferry.transform.import_courses import import_courses
+from ferry.transform.import_evaluations import import_evaluations
+
+SEASONS = ["202301", "202303"]
+
+
+def write_parsed_courses(data_dir: Path, rng: random.Random):
+    """
+    Parsed courses shaped like `ParsedCourse`, with cross-listings, professors
+    with and without emails, flags, and meetings in a few locations.
+    """
+    (data_dir / "parsed_courses").mkdir(parents=True)
+    for season in SEASONS:
+        courses = []
+        crn = 10000
+        while len(courses) < 200:
+            crns = list(range(crn, crn + rng.choice([1, 1, 2])))
+            crn += len(crns) + 1
+            number = rng.randint(0, 50)
+            for listing_crn in crns:
+                courses.append(
+                    {
+                        "crn": listing_crn,
+                        "crns": [str(x) for x in crns],
+                        "primary_crn": crns[0],
+                        "colsem": False,
+                        "fysem": rng.random() < 0.1,
+                        "sysem": False,
+                        "school": rng.choice(["YC", "GS"]),
+                        "course_code": f"CPSC {100 + number}",
+                        "section": "1",
+                        "title": f"Course {number}",
+                        "description": "A course.",
+                        "skills": rng.choice([[], ["QR"]]),
+                        "areas": [],
+                        "flags": rng.choice([[], ["YC Writing"]]),
+                        "professors": [f"Prof {number % 17}"],
+                        "professor_emails": [
+                            rng.choice(["", f"prof{number % 17}@yale.edu"])
+                        ],
+                        "meetings": [
+                            {
+                                "days_of_week": 2,
+                                "start_time": "9:00",
+                                "end_time": "10:15",
+                                "location": rng.choice(
+                                    ["WLH 1 - WLH 1", "TBA", "HQ 2"]
+                                ),
+                                "location_url": "",
+                            }
+                        ],
+                    }
+                )
+        (data_dir / "parsed_courses" / f"{season}.json").write_text(json.dumps(courses))
+
+
+def write_parsed_evaluations(
+    data_dir: Path, listings: pd.DataFrame, rng: random.Random
+):
+    (data_dir / "parsed_evaluations").mkdir(parents=True)
+    for season in SEASONS:
+        evals = [
+            {
+                "season": season,
+                "crn": int(crn),
+                "enrolled": rng.choice([None, 20]),
+                "responses": 5,
+                "extras": rng.choice([{}, {"instructors": 1}]),
+                "ratings": [
+                    {
+                        "question_code": "YC401",
+                        "question_text": "Overall?",
+                        "options": ["poor", "good"],
+                        "data": [rng.randint(0, 9), 2],
+                    }
+                ],
+                "narratives": [
+                    {
+                        "question_code": "YC402",
+                        "question_text": "Comments?",
+                        "comments": ["Good.", "Hard."],
+                    }
+                ],
+            }
+            for crn in listings.loc[listings["season_code"] == season, "crn"][:50]
+        ]
+        (data_dir / "parsed_evaluations" / f"{season}.json").write_text(
+            json.dumps(evals)
+        )
+
+
+@pytest.fixture
+def importer_tables(tmp_path: Path) -> dict[str, pd.DataFrame]:
+    rng = random.Random(0)
+    write_parsed_courses(tmp_path, rng)
+    (tmp_path / "id_cache").mkdir()
+    course_tables = import_courses(tmp_path, SEASONS)
+    write_parsed_evaluations(tmp_path, course_tables["listings"], rng)
+    eval_tables = import_evaluations(tmp_path, course_tables["listings"])
+    return {**course_tables, **eval_tables}
+
+
+def test_importer_tables_round_trip(
+    importer_tables: dict[str, pd.DataFrame], tmp_path: Path
+):
+    for table_name, table in importer_tables.items():
+        path = tmp_path / "tables" / f"{table_name}.parquet"
+        write_parquet(table, path)
+        # The index is dropped, as in the CSV snapshots
+        pd.testing.assert_frame_equal(
+            read_parquet(path), table.reset_index(drop=True), obj=table_name
+        )
+
+    # Sets of cross-listed CRNs are kept as sets, not stringified
+    crns = read_parquet(tmp_path / "tables" / "listings.parquet")["crns"]
+    assert crns.map(type).eq(frozenset).all()
+    assert crns.map(len).max() == 2
+
+
+def test_set_column_with_missing_values(tmp_path: Path):
+    frame = pd.DataFrame({"crns": [frozenset({3, 1}), None, {2}]})
+    write_parquet(frame, tmp_path / "sets.parquet")
+
+    crns = read_parquet(tmp_path / "sets.parquet")["crns"]
+
+    assert crns.tolist() == [frozenset({1, 3}), None, frozenset({2})]
+
+
+def test_unencodable_values_raise(tmp_path: Path):
+    frame = pd.DataFrame({"value": [1, object()]})
+
+    with pytest.raises(TypeError, match="'value'"):
+        write_parquet(frame, tmp_path / "bad.parquet")
+    assert not (tmp_path / "bad.parquet").exists()
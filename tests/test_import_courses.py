@@ -0,0 +1,188 @@
+"""
+Equivalence tests for the column-wise ID generation, against the row-wise
+`DataFrame.apply` implementations it replaced.
+"""
+
+import logging
+from collections.abc import Callable
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from ferry.crawler.cache import load_cache_json, save_cache_json
+from ferry.transform.import_courses import (
+    generate_id,
+    generate_listing_ids,
+    professor_cache_keys,
+)
+
+
+def legacy_generate_id(
+    df: pd.DataFrame,
+    get_cache_key: Callable[[pd.Series], str | tuple[str, ...]],
+    cache_path: Path,
+) -> pd.Series:
+    """
+    The previous generate_id, which built each row's cache key with apply.
+    """
+    id_cache: dict[str, int] = load_cache_json(cache_path) or {}
+
+    def get_applicable_key(row: pd.Series):
+        keys = get_cache_key(row)
+        if isinstance(keys, str):
+            return keys
+        return next((key for key in keys if key in id_cache), keys[0])
+
+    cache_keys = df.apply(get_applicable_key, axis=1)
+    ids = cache_keys.map(id_cache)
+    max_flag_id = max(id_cache.values(), default=0)
+    unmapped = cache_keys[ids.isna()].unique()
+    new_flag_ids = pd.Series(range(max_flag_id + 1, max_flag_id + 1 + len(unmapped)))
+    unused_keys = set(id_cache.keys()) - set(cache_keys.values)
+    logging.warning(f"Unused keys in {cache_path}: {unused_keys}")
+    return ids.fillna(
+        cache_keys.map(dict(zip(unmapped, new_flag_ids, strict=True)))
+    ).astype(int)
+
+
+def legacy_professor_cache_key(row: pd.Series) -> tuple[str, str]:
+    return (
+        f"{row['name']} <{row['email']}>" if row["email"] else row["name"],
+        row["name"],
+    )
+
+
+def legacy_generate_listing_id(row: pd.Series) -> int:
+    season = int(row["season_code"]) - 200000
+    return season * 100000 + row["crn"]
+
+
+def random_professors(seed: int, size: int) -> pd.DataFrame:
+    rng = np.random.default_rng(seed)
+    names = rng.choice([f"Prof {i}" for i in range(size // 4)], size)
+    emails = np.where(
+        rng.random(size) < 0.3,
+        "",
+        np.char.add(np.char.replace(names.astype(str), " ", "."), "@yale.edu"),
+    )
+    return pd.DataFrame({"name": names, "email": emails})
+
+
+@pytest.fixture
+def professors() -> pd.DataFrame:
+    return pd.DataFrame(
+        [
+            # Cached with their email
+            ("Ada Lovelace", "ada@yale.edu"),
+            # Email only published after the name-only key was cached; the
+            # name-only ID is reused
+            ("Alan Turing", "alan@yale.edu"),
+            # Never had an email
+            ("Grace Hopper", ""),
+            # Cached both with and without email; the email key wins
+            ("Edsger Dijkstra", "edsger@yale.edu"),
+            ("Edsger Dijkstra", ""),
+            # New professors
+            ("Barbara Liskov", "barbara@yale.edu"),
+            ("Donald Knuth", ""),
+            # Repeated rows get the same ID
+            ("Ada Lovelace", "ada@yale.edu"),
+            ("Barbara Liskov", "barbara@yale.edu"),
+        ],
+        columns=["name", "email"],
+    )
+
+
+@pytest.fixture
+def professor_cache(tmp_path: Path) -> Path:
+    cache_path = tmp_path / "professor_id.json"
+    save_cache_json(
+        cache_path,
+        {
+            "Ada Lovelace <ada@yale.edu>": 1,
+            "Alan Turing": 2,
+            "Grace Hopper": 3,
+            "Edsger Dijkstra <edsger@yale.edu>": 4,
+            "Edsger Dijkstra": 5,
+            # No longer in the catalog
+            "Claude Shannon": 9,
+        },
+    )
+    return cache_path
+
+
+def test_professor_ids_match_legacy(professors: pd.DataFrame, professor_cache: Path):
+    expected = legacy_generate_id(
+        professors, legacy_professor_cache_key, professor_cache
+    )
+    actual = generate_id(
+        professor_cache_keys(professors),
+        professor_cache,
+        fallback_keys=professors["name"],
+    )
+
+    pd.testing.assert_series_equal(actual, expected)
+    # Spot-check the cases above, so a shared mistake cannot go unnoticed
+    assert actual.tolist() == [1, 2, 3, 4, 5, 10, 11, 1, 10]
+
+
+@pytest.mark.parametrize("seed", [0, 1, 2])
+def test_random_professor_ids_match_legacy(tmp_path: Path, seed: int):
+    professors = random_professors(seed, 2000)
+    cache_path = tmp_path / "professor_id.json"
+    # Cache a random mix of full and name-only keys from an earlier catalog
+    earlier = random_professors(seed + 100, 2000).drop_duplicates()
+    earlier_keys = legacy_generate_id(
+        earlier, lambda row: legacy_professor_cache_key(row)[0], cache_path
+    )
+    save_cache_json(
+        cache_path,
+        dict(
+            zip(
+                earlier.apply(lambda row: legacy_professor_cache_key(row)[0], axis=1),
+                earlier_keys.tolist(),
+                strict=True,
+            )
+        )
+        | {name: i + 5000 for i, name in enumerate(earlier["name"].unique()[::3])},
+    )
+
+    expected = legacy_generate_id(professors, legacy_professor_cache_key, cache_path)
+    actual = generate_id(
+        professor_cache_keys(professors),
+        cache_path,
+        fallback_keys=professors["name"],
+    )
+
+    pd.testing.assert_series_equal(actual, expected)
+
+
+def test_flag_ids_match_legacy(tmp_path: Path):
+    flags = pd.DataFrame(
+        {"flag_text": ["YC Writing", "Cancelled", "YC Writing", "Permission", "New"]}
+    )
+    cache_path = tmp_path / "flag_id.json"
+    save_cache_json(cache_path, {"Cancelled": 3, "Permission": 7, "Gone": 8})
+
+    expected = legacy_generate_id(flags, lambda row: row["flag_text"], cache_path)
+    actual = generate_id(flags["flag_text"], cache_path)
+
+    pd.testing.assert_series_equal(actual, expected, check_names=False)
+    assert actual.tolist() == [9, 3, 9, 7, 10]
+
+
+def test_listing_ids_match_legacy():
+    rng = np.random.default_rng(0)
+    listings = pd.DataFrame(
+        {
+            "season_code": rng.choice(["200903", "202101", "202403", "202601"], 500),
+            "crn": rng.integers(10000, 40000, 500),
+        }
+    )
+
+    expected = listings.apply(legacy_generate_listing_id, axis=1)
+    actual = generate_listing_ids(listings)
+
+    assert actual.tolist() == expected.tolist()
@@ -0,0 +1,143 @@
+"""
+Regression tests for the groupby-based rating averages, against the dict
+loops they replaced.
+
+pandas' grouped mean uses compensated summation while the loops summed
+naively, so averages may differ by an ulp; they are compared with `rtol`.
+"""
+
+import math
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from ferry.transform.transform_compute import (
+    courses_computed,
+    group_rating_averages,
+    professors_computed,
+)
+
+RTOL = 1e-12
+
+
+def legacy_group_averages(
+    group_to_courses: dict[int, list[int]], ratings: dict[int, float]
+) -> dict[int, tuple[float | None, int]]:
+    """
+    The previous per-group loop of courses_computed.
+    """
+    averages = {}
+    for group_id, course_ids in group_to_courses.items():
+        values = [ratings.get(course_id) for course_id in course_ids]
+        values = [x for x in values if x is not None and not math.isnan(x)]
+        averages[group_id] = (
+            (sum(values) / len(values), len(values)) if values else (None, 0)
+        )
+    return averages
+
+
+def legacy_professor_averages(
+    course_professors: pd.DataFrame, ratings: dict[int, float]
+) -> pd.DataFrame:
+    """
+    The previous per-professor loop of professors_computed.
+    """
+    rows = []
+    for professor_id, course_ids in (
+        course_professors.groupby("professor_id")["course_id"].apply(list).items()
+    ):
+        values = [ratings.get(course_id) for course_id in course_ids]
+        values = [x for x in values if x is not None and not np.isnan(x)]
+        rows.append(
+            {
+                "professor_id": professor_id,
+                "average_rating": np.mean(values) if values else np.nan,
+                "average_rating_n": len(values),
+            }
+        )
+    return pd.DataFrame(rows).set_index("professor_id")
+
+
+def assert_averages_equal(actual: pd.Series, expected: pd.Series):
+    np.testing.assert_allclose(
+        actual.astype(float).to_numpy(),
+        expected.astype(float).to_numpy(),
+        rtol=RTOL,
+        equal_nan=True,
+    )
+
+
+@pytest.mark.parametrize("group_column", ["same_course_id", "same_course_and_profs_id"])
+@pytest.mark.parametrize("rating_column", ["avg_rating", "avg_workload"])
+def test_course_averages_match_legacy_loop(
+    catalog: dict[str, pd.DataFrame], group_column: str, rating_column: str
+):
+    courses = courses_computed(
+        courses=catalog["courses"].copy(),
+        listings=catalog["listings"],
+        evaluation_statistics=catalog["evaluation_statistics"],
+        course_professors=catalog["course_professors"],
+        professors=professors_computed(
+            catalog["professors"],
+            catalog["course_professors"],
+            catalog["evaluation_statistics"],
+        ),
+        workers=1,
+    )
+    # Some groups must span several courses, or nothing is averaged
+    assert courses[group_column].value_counts().max() > 1
+
+    group_to_courses = (
+        courses.index.to_series().groupby(courses[group_column]).apply(list).to_dict()
+    )
+    legacy = legacy_group_averages(
+        group_to_courses, catalog["evaluation_statistics"][rating_column].to_dict()
+    )
+    expected = courses[group_column].map(legacy)
+    output_column = rating_column.replace("avg_", "average_") + (
+        "_same_professors" if group_column == "same_course_and_profs_id" else ""
+    )
+
+    assert_averages_equal(
+        courses[output_column], expected.map(lambda x: x[0]).astype(float)
+    )
+    assert courses[f"{output_column}_n"].dtype == pd.Int64Dtype()
+    assert (
+        courses[f"{output_column}_n"].tolist() == expected.map(lambda x: x[1]).tolist()
+    )
+
+
+def test_professor_averages_match_legacy_loop(catalog: dict[str, pd.DataFrame]):
+    professors = professors_computed(
+        catalog["professors"],
+        catalog["course_professors"],
+        catalog["evaluation_statistics"],
+    )
+    legacy = legacy_professor_averages(
+        catalog["course_professors"],
+        catalog["evaluation_statistics"]["avg_rating"].to_dict(),
+    ).reindex(professors.index)
+
+    assert_averages_equal(professors["average_rating"], legacy["average_rating"])
+    assert professors["average_rating_n"].dtype == pd.Int64Dtype()
+    # Professors without courses have no count at all, as before
+    pd.testing.assert_series_equal(
+        professors["average_rating_n"],
+        legacy["average_rating_n"].astype(pd.Int64Dtype()),
+    )
+
+
+def test_group_rating_averages_counts_courses_in_several_groups():
+    ratings = pd.DataFrame(
+        {"avg_rating": [1.0, 2.0, np.nan]}, index=pd.Index([1, 2, 3], name="course_id")
+    )
+    # Course 1 is in both groups, course 3 has no rating, course 4 no row
+    course_to_group = pd.Series([10, 20, 20, 20, 20], index=[1, 1, 2, 3, 4])
+
+    averages = group_rating_averages(course_to_group, ratings)["avg_rating"]
+
+    assert averages.loc[10, "mean"] == 1.0
+    assert averages.loc[20, "mean"] == 1.5
+    assert averages["count"].tolist() == [1, 2]
+    assert averages["count"].dtype == pd.Int64Dtype()